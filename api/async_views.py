@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from .instrumentation import timer, track_queries
+
+# Django 3.2 has no async ORM, so read requests are run on this pool of
+# threads, each with its own database connection. Under ASGI this keeps
+# them off the single thread Django otherwise runs every sync view on.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS, thread_name_prefix="async-view"
+)
+
+OFFLOADED_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def _run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        with track_queries():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render") and callable(response.render):
+                with timer("render"):
+                    response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offload(view):
+    """
+    Wrap a sync view in an async one. Reads run concurrently on the
+    executor; writes keep Django's default thread-sensitive handling.
+    """
+
+    async def async_view(request, *args, **kwargs):
+        if request.method in OFFLOADED_METHODS:
+            loop = asyncio.get_running_loop()
+            # Carry the request's context (and its metrics) to the thread.
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                _executor,
+                partial(context.run, _run_view, view, request, *args, **kwargs),
+            )
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    async_view.csrf_exempt = getattr(view, "csrf_exempt", False)
+    return async_view
+
+
+def offload_urlpatterns(urlpatterns, names):
+    return [
+        (
+            URLPattern(
+                pattern.pattern,
+                offload(pattern.callback),
+                pattern.default_args,
+                pattern.name,
+            )
+            if isinstance(pattern, URLPattern) and pattern.name in names
+            else pattern
+        )
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import CacheStats
+
+token_cache_stats = CacheStats()
+
+
+def get_token_cache():
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def token_cache_key(key):
+    return f"token:{key}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers each token's (user, token) pair in a
+    bounded cache with a short TTL, so most requests skip the token/user
+    query. Entries are dropped when the token is deleted or its user saved.
+    """
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        credentials = token_cache.get(token_cache_key(key))
+        if credentials is not None:
+            token_cache_stats.count("hits")
+            return credentials
+
+        token_cache_stats.count("misses")
+        credentials = super().authenticate_credentials(key)
+        token_cache.set(token_cache_key(key), credentials)
+        return credentials
@@ -0,0 +1,287 @@
+import json
+import random
+import resource
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from .models import Book, BookRecord, BookReview, BookStats, User
+
+WORDS = (
+    "hope despair garden river empire winter letters journey stranger ocean "
+    "kingdom memory silence harvest war peace night island mirror machine "
+    "daughter fire glass orchard tide shadow crown north library storm"
+).split()
+
+# Generated text is mostly filler, with the searchable WORDS mixed in sparsely
+# so a search term matches a realistic fraction of rows rather than most of
+# the table (which would make a sequential scan the planner's right choice).
+SYLLABLES = "ka lo mi ne ru sa te vo ba di fe gu ho ji ku la mo nu pe ri".split()
+FILLER = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES[:5]]
+SEARCH_WORD_RATE = 0.02
+
+BENCHMARK_USERNAME = "benchmark_reader"
+
+
+def sentence(rng, length):
+    return " ".join(
+        rng.choice(WORDS) if rng.random() < SEARCH_WORD_RATE else rng.choice(FILLER)
+        for _ in range(length)
+    )
+
+
+def seed_library(
+    rng, books=0, users=0, records=0, reviews=0, batch_size=5_000, log=print
+):
+    """
+    Bulk-insert generated books, users, book records and reviews, then
+    build the derived search documents and stats the signals would have.
+    """
+    log(f"Seeding {books} books...")
+    Book.objects.bulk_create(
+        (
+            Book(
+                title=f"{sentence(rng, 3)} {n}",
+                author=sentence(rng, 2),
+                publication_year=rng.randint(1500, 2020),
+                featured=rng.random() < 0.01,
+            )
+            for n in range(books)
+        ),
+        batch_size=batch_size,
+    )
+    book_ids = list(Book.objects.values_list("pk", flat=True))
+
+    log(f"Seeding {users} users...")
+    password = make_password(None)
+    User.objects.bulk_create(
+        (User(username=f"reader{n}", password=password) for n in range(users)),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.values_list("pk", flat=True))
+
+    log(f"Seeding {records} book records...")
+    states = [choice for choice, _ in BookRecord.ReadingState.choices]
+    BookRecord.objects.bulk_create(
+        (
+            BookRecord(
+                book_id=rng.choice(book_ids),
+                reader_id=rng.choice(user_ids),
+                reading_state=rng.choice(states),
+            )
+            for _ in range(records)
+        ),
+        batch_size=batch_size,
+    )
+
+    log(f"Seeding {reviews} reviews...")
+    BookReview.objects.bulk_create(
+        (
+            BookReview(
+                book_id=rng.choice(book_ids),
+                reviewed_by_id=rng.choice(user_ids) if user_ids else None,
+                body=sentence(rng, 40),
+            )
+            for _ in range(reviews)
+        ),
+        batch_size=batch_size,
+    )
+
+    log("Building search documents and book stats...")
+    BookReview.objects.update_search_vector()
+    Book.objects.update_search_document()
+    for start in range(0, len(book_ids), batch_size):
+        BookStats.objects.reconcile(book_ids[start : start + batch_size])
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+@contextmanager
+def seeded_test_database(keepdb=False, seed=0, log=print, **counts):
+    """
+    Switch to a test database filled by seed_library() for the duration of
+    the block. With keepdb, the seeded database is reused by later runs.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        if not Book.objects.exists():
+            seed_library(random.Random(seed), log=log, **counts)
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def unthrottled():
+    """Turn off the API rate limits, which load tests would otherwise hit."""
+    return override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"anon": None, "user": None},
+        }
+    )
+
+
+def benchmark_urls(rng):
+    """
+    The endpoints to measure, as {name: callable returning a URL}. Each call
+    can pick different ids and search terms so caches see realistic traffic.
+    """
+    book_ids = list(Book.objects.values_list("pk", flat=True)[:10_000])
+    return {
+        "books-list": lambda: "/api/books",
+        "books-search": lambda: f"/api/books?search={rng.choice(WORDS)}",
+        "books-featured": lambda: "/api/books/featured",
+        "books-popular": lambda: "/api/books/popular",
+        "books-detail": lambda: f"/api/books/{rng.choice(book_ids)}",
+        "book-reviews": lambda: f"/api/books/{rng.choice(book_ids)}/reviews",
+        "book-reviews-search": lambda: (
+            f"/api/books/{rng.choice(book_ids)}/reviews?search={rng.choice(WORDS)}"
+        ),
+        "reviews-search": lambda: f"/api/reviews?search={rng.choice(WORDS)}",
+        "book-records": lambda: "/api/book_records",
+    }
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def summarize(timings, elapsed, errors, queries=None, rss_growth=None):
+    timings = sorted(timings)
+    result = {
+        "requests": len(timings),
+        "errors": errors,
+        "rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+    }
+    if queries is not None:
+        result["queries_per_request"] = round(queries / len(timings), 2)
+    if rss_growth is not None:
+        result["peak_rss_growth_kb"] = rss_growth
+    return result
+
+
+def run_in_process(make_url, token, requests, warmup):
+    """
+    Drive the URL through Django's test client on the configured database,
+    counting queries per request and how far the run raised the process's
+    peak RSS. Earlier runs in the same process set the starting peak.
+    """
+    for alias in ("book_responses", "auth_tokens"):
+        caches[alias].clear()
+    client = Client(raise_request_exception=False)
+    headers = {"HTTP_AUTHORIZATION": f"Token {token}"}
+    for _ in range(warmup):
+        client.get(make_url(), **headers)
+
+    timings, errors, queries = [], 0, 0
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    for _ in range(requests):
+        url = make_url()
+        with CaptureQueriesContext(connection) as captured:
+            request_start = time.perf_counter()
+            response = client.get(url, **headers)
+            timings.append(time.perf_counter() - request_start)
+        queries += len(captured)
+        errors += response.status_code >= 400
+    elapsed = time.perf_counter() - start
+    return summarize(timings, elapsed, errors, queries, peak_rss_kb() - rss_before)
+
+
+def run_over_http(make_url, token, requests, warmup, base_url, concurrency):
+    """
+    Drive the URL against a running server (for example the WSGI and ASGI
+    deployments) from `concurrency` client threads. Refused connections and
+    other transport errors count as errors. The server's memory isn't
+    visible from here, so nothing is reported for it.
+    """
+
+    def fetch(url):
+        request = Request(base_url + url, headers={"Authorization": f"Token {token}"})
+        request_start = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                failed = False
+        except OSError:
+            # HTTPError and URLError, such as a refused connection, included
+            failed = True
+        return time.perf_counter() - request_start, failed
+
+    urls = [make_url() for _ in range(warmup + requests)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fetch, urls[:warmup]))
+        start = time.perf_counter()
+        results = list(pool.map(fetch, urls[warmup:]))
+        elapsed = time.perf_counter() - start
+    return summarize(
+        [timing for timing, _ in results],
+        elapsed,
+        sum(failed for _, failed in results),
+    )
+
+
+def compare(baseline, current, threshold):
+    """
+    Yield (endpoint, metric, baseline value, current value, regressed) for
+    the metrics that matter, flagging changes worse than `threshold`.
+    """
+    for name, metrics in current["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in (
+            ("rps", True),
+            ("p50_ms", False),
+            ("p95_ms", False),
+            ("p99_ms", False),
+            ("queries_per_request", False),
+        ):
+            if metric not in metrics or metric not in before:
+                continue
+            old, new = before[metric], metrics[metric]
+            if metric == "queries_per_request":
+                regressed = new > old
+            elif higher_is_better:
+                regressed = new < old * (1 - threshold)
+            else:
+                regressed = new > old * (1 + threshold)
+            yield name, metric, old, new, regressed
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def save_results(path, results):
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import uuid
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.functions import Now
+from rest_framework.response import Response
+
+from .models import CacheGeneration
+
+_evictions = Counter()
+
+# The generation of every scope that has never been invalidated
+INITIAL_GENERATION = uuid.UUID(int=0)
+
+
+class LRUCache(LocMemCache):
+    """
+    Local memory cache that evicts only the least recently used entry when
+    full, instead of culling a fraction of the cache, and counts evictions.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._name = name
+
+    def _cull(self):
+        key, _ = self._cache.popitem()
+        del self._expire_info[key]
+        _evictions[self._name] += 1
+
+    @property
+    def evictions(self):
+        return _evictions[self._name]
+
+
+class CacheStats:
+    """
+    Process-local hit and miss counters for a cache, reported together with
+    the backend's eviction count when it keeps one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def count(self, stat):
+        with self._lock:
+            self._counts[stat] += 1
+
+    def as_dict(self, cache):
+        with self._lock:
+            stats = {"hits": self._counts["hits"], "misses": self._counts["misses"]}
+        stats["evictions"] = getattr(cache, "evictions", None)
+        return stats
+
+
+class ResponseCache:
+    """
+    Caches serialized response data under a set of scopes, such as "books"
+    or "book:12". Invalidating a scope replaces its generation token, so
+    every entry stored under the old token is never read again and ages out
+    of the backend.
+
+    The tokens live in the api_cachegeneration table rather than the cache,
+    so an invalidation reaches every process, including task workers, and
+    takes effect when the transaction that made it commits.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.stats = CacheStats()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generations(self, scopes):
+        generations = {
+            scope: (generation, invalidated_at)
+            for scope, generation, invalidated_at in CacheGeneration.objects.filter(
+                scope__in=scopes
+            ).values_list("scope", "generation", "invalidated_at")
+        }
+        # A scope gets a row only when it is first invalidated, so reads,
+        # including those of scopes that name no object, never write
+        return [generations.get(scope, (INITIAL_GENERATION, None)) for scope in scopes]
+
+    def generations(self, request, scopes):
+        """
+        The (generation token, invalidation time) pairs of `scopes`, read
+        once per request so that everything derived from them describes
+        the same data. Scopes never invalidated have no invalidation time.
+        """
+        if not hasattr(request, "cache_generations"):
+            request.cache_generations = {}
+        scopes = tuple(scopes)
+        if scopes not in request.cache_generations:
+            request.cache_generations[scopes] = self._generations(scopes)
+        return request.cache_generations[scopes]
+
+    def make_key(self, request, scopes):
+        generations = ":".join(
+            generation.hex for generation, _ in self.generations(request, scopes)
+        )
+        location = hashlib.md5(
+            request.build_absolute_uri().encode(), usedforsecurity=False
+        ).hexdigest()
+        return f"response:{location}:{generations}"
+
+    def invalidate(self, *scopes):
+        CacheGeneration.objects.bulk_create(
+            [CacheGeneration(scope=scope) for scope in scopes], ignore_conflicts=True
+        )
+        CacheGeneration.objects.filter(scope__in=scopes).update(
+            generation=uuid.uuid4(), invalidated_at=Now()
+        )
+
+
+book_response_cache = ResponseCache(settings.BOOK_RESPONSE_CACHE)
+
+
+def get_request_scopes(view, scopes, kwargs):
+    request_scopes = [scope.format(**kwargs) for scope in scopes]
+    if hasattr(view, "get_cache_scopes"):
+        request_scopes = view.get_cache_scopes(request_scopes)
+    return request_scopes
+
+
+def cache_response(*scopes):
+    """
+    Cache a view handler's 200 responses under `scopes`. Scopes are
+    formatted with the URL kwargs, so "book:{pk}" names one book, and views
+    can add request-dependent scopes with a get_cache_scopes() method.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            response_cache = book_response_cache
+            request_scopes = get_request_scopes(view, scopes, kwargs)
+            key = response_cache.make_key(request, request_scopes)
+            data = response_cache.cache.get(key)
+            if data is not None:
+                response_cache.stats.count("hits")
+                return Response(data)
+
+            response_cache.stats.count("misses")
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                response_cache.cache.set(key, response.data)
+            return response
+
+        # Lets api.conditional derive ETags from the same generations
+        wrapper.cache_scopes = scopes
+        return wrapper
+
+    return decorator
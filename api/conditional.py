@@ -0,0 +1,95 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from django.db.models import Count
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import book_response_cache, get_request_scopes
+
+
+def _etag(request, state):
+    # The renderer is part of the representation, e.g. JSON vs browsable API
+    validator = f"{request.get_full_path()}|{request.accepted_media_type}|{state}"
+    return quote_etag(hashlib.md5(validator.encode()).hexdigest())
+
+
+def get_validators(view, request, kwargs):
+    """
+    Compute an (ETag, Last-Modified) pair for a list or detail request from
+    one aggregate query over the rows the response would contain. Only
+    detail responses get a Last-Modified: a row deleted from a list leaves
+    the latest timestamp unchanged.
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    detail = lookup_url_kwarg in kwargs
+    if detail:
+        queryset = queryset.filter(**{view.lookup_field: kwargs[lookup_url_kwarg]})
+
+    aggregates = queryset.aggregate(
+        count=Count("pk", distinct=True), **view.get_validator_aggregates()
+    )
+    if detail and not aggregates["count"]:
+        return None, None
+
+    last_modified = None
+    timestamps = [
+        value for value in aggregates.values() if isinstance(value, datetime.datetime)
+    ]
+    if detail and timestamps:
+        last_modified = int(max(timestamps).timestamp())
+    return _etag(request, sorted(aggregates.items())), last_modified
+
+
+def get_cached_validators(view, request, kwargs, scopes):
+    """
+    Compute the ETag and Last-Modified of a handler wrapped in
+    api.cache.cache_response from the generations its cache key uses, so
+    they and a cached body always describe the same data. Costs no query
+    beyond the cache's own.
+    """
+    request_scopes = get_request_scopes(view, scopes, kwargs)
+    generations = book_response_cache.generations(request, request_scopes)
+    etag = _etag(request, ":".join(generation.hex for generation, _ in generations))
+    # Any change invalidates one of the scopes, deletes included, so this
+    # works for lists too. Scopes never invalidated are older still.
+    timestamps = [invalidated_at for _, invalidated_at in generations if invalidated_at]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+def conditional_response(handler):
+    """
+    Answer If-None-Match / If-Modified-Since with a 304 before the handler
+    runs, and add ETag and Last-Modified headers to its response. Handlers
+    wrapped in cache_response take both from the response cache's
+    generations; other views provide get_validator_aggregates() returning
+    the Max/Count aggregates that change whenever the serialized
+    representation does.
+    """
+    scopes = getattr(handler, "cache_scopes", None)
+
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        if scopes is not None:
+            etag, last_modified = get_cached_validators(view, request, kwargs, scopes)
+        else:
+            etag, last_modified = get_validators(view, request, kwargs)
+        if etag is None:
+            return handler(view, request, *args, **kwargs)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(view, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ["Accept"])
+        return response
+
+    return wrapper
@@ -1,21 +1,25 @@
 from rest_framework import permissions
 
 
-class IsReaderOrReadOnly(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if request.user.is_authenticated:
-            return True
-        return False
+def filter_writable(request, view, queryset):
+    """
+    Narrow `queryset` to the objects that every permission of `view` lets
+    the user change, in SQL, so a bulk action needs no per-object checks.
+    """
+    for permission in view.get_permissions():
+        if hasattr(permission, "filter_writable"):
+            queryset = permission.filter_writable(request, view, queryset)
+    return queryset
 
-    def has_object_permission(self, request, view, obj):
-        if request.method in permissions.SAFE_METHODS:
-            return True
-        if obj.reader == request.user:
-            return True
-        return False
 
+class IsOwnerOrReadOnly(permissions.BasePermission):
+    """
+    Anyone authenticated can read; only the user in `owner_field` can
+    change. Compares the foreign key id, so the owner is never loaded.
+    """
+
+    owner_field = None
 
-class IsReviewerOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.user.is_authenticated:
             return True
@@ -24,10 +28,23 @@ class IsReviewerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        if obj.reviewed_by == request.user:
+        if getattr(obj, f"{self.owner_field}_id") == request.user.pk:
             return True
         return False
 
+    def filter_writable(self, request, view, queryset):
+        if not request.user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(**{f"{self.owner_field}_id": request.user.pk})
+
+
+class IsReaderOrReadOnly(IsOwnerOrReadOnly):
+    owner_field = "reader"
+
+
+class IsReviewerOrReadOnly(IsOwnerOrReadOnly):
+    owner_field = "reviewed_by"
+
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -41,3 +58,8 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if request.user.is_staff:
             return True
         return False
+
+    def filter_writable(self, request, view, queryset):
+        if request.user.is_staff:
+            return queryset
+        return queryset.none()
@@ -0,0 +1,103 @@
+"""
+PostgreSQL backend adding what Django 3.2 lacks for long-lived connections:
+CONN_HEALTH_CHECKS, which checks a reused connection before its first query
+in each request, and POOL, an in-process connection pool shared by the
+threads of a worker ({"size": ..., "max_overflow": ..., "timeout": ...}).
+"""
+
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .creation import DatabaseCreation
+from .pool import ConnectionPool, PoolTimeout
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _ping(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        # Leave the connection idle for connect() to set autocommit on it
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    health_check_done = False
+    pool = None
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get("POOL")
+        # Connections made without a database name (to create or drop the
+        # test database) are not pooled.
+        if not options or self.settings_dict["NAME"] is None:
+            return None
+        key = (self.alias, tuple(sorted(conn_params.items())), tuple(options.items()))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(**options)
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        # A new or freshly checked out connection needs no health check
+        self.health_check_done = True
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        connect = partial(super().get_new_connection, conn_params)
+        check = _ping if self.settings_dict.get("CONN_HEALTH_CHECKS") else None
+        try:
+            connection = self.pool.get(connect, check)
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+        connection = self.connection
+        try:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Database.Error:
+            self.pool.discard(connection)
+        else:
+            self.pool.put(connection)
+
+    def close_pool(self):
+        """Close the idle pooled connections of this alias."""
+        with _pools_lock:
+            pools = [pool for key, pool in _pools.items() if key[0] == self.alias]
+        for pool in pools:
+            pool.close_idle()
+
+    def ensure_connection(self):
+        # Checked lazily, so requests that don't query pay nothing
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
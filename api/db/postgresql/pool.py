@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections. Up to `size` idle connections
+    are kept; up to `max_overflow` more are opened under load and closed
+    when returned. get() waits up to `timeout` seconds for a free one.
+    """
+
+    def __init__(self, size, max_overflow, timeout):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._available = threading.Condition()
+
+    def get(self, connect, check=None):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._available:
+                while not self._idle and self._open >= self.size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            f"({self._open} open)."
+                        )
+                    self._available.wait(remaining)
+                if self._idle:
+                    # Last in, first out, so surplus connections go cold
+                    connection = self._idle.pop()
+                else:
+                    connection = None
+                    self._open += 1
+
+            if connection is None:
+                try:
+                    return connect()
+                except BaseException:
+                    self._release()
+                    raise
+            if not connection.closed and (check is None or check(connection)):
+                return connection
+            self.discard(connection)
+
+    def put(self, connection):
+        with self._available:
+            if not connection.closed and len(self._idle) < self.size:
+                self._idle.append(connection)
+                self._available.notify()
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        finally:
+            self._release()
+
+    def close_idle(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self._available:
+            return {"open": self._open, "idle": len(self._idle)}
+
+    def _release(self):
+        with self._available:
+            self._open -= 1
+            self._available.notify()
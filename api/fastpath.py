@@ -0,0 +1,137 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .instrumentation import timer
+from .renderers import FastJSONRenderer, fragment_cache
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+VALUE, BOOLEAN, NESTED, FRAGMENT = "value", "boolean", "nested", "fragment"
+
+
+def _fragment(serializer, prefix, mapping):
+    # Serializers that set fragment_key, e.g. ("pk", "updated_at"), are
+    # encoded once per distinct key and reused from the fragment cache.
+    key_lookups = tuple(prefix + lookup for lookup in serializer.fragment_key)
+    return (type(serializer).__name__, key_lookups, mapping)
+
+
+def _compile(serializer, prefix="", fragments=False):
+    mapping = []
+    for key, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        lookup = prefix + "__".join(field.source_attrs)
+        if isinstance(field, serializers.BaseSerializer):
+            model_field = serializer.Meta.model._meta.get_field(field.source)
+            if isinstance(field, serializers.ListSerializer) or model_field.null:
+                raise ImproperlyConfigured(
+                    f"{key}: only nested serializers of required foreign keys "
+                    "can be read from values()."
+                )
+            nested = _compile(field, lookup + "__", fragments)
+            if fragments and getattr(field, "fragment_key", None):
+                mapping.append((key, FRAGMENT, _fragment(field, lookup + "__", nested)))
+            else:
+                mapping.append((key, NESTED, nested))
+        elif isinstance(field, serializers.SlugRelatedField):
+            mapping.append((key, VALUE, f"{lookup}__{field.slug_field}"))
+        elif isinstance(field, serializers.BooleanField):
+            mapping.append((key, BOOLEAN, lookup))
+        elif isinstance(field, PASSTHROUGH_FIELDS):
+            mapping.append((key, VALUE, lookup))
+        else:
+            raise ImproperlyConfigured(
+                f"{key}: {type(field).__name__} can't be read from values()."
+            )
+    return tuple(mapping)
+
+
+@lru_cache(maxsize=None)
+def values_mapping(serializer_class, fragments=False):
+    """
+    Compile a read-only serializer into ((key, kind, source), ...), where
+    source is a values() lookup or, for NESTED, another mapping. With
+    fragments, the serializer itself and nested serializers that set
+    fragment_key are represented by cached JSONFragments.
+    """
+    serializer = serializer_class()
+    mapping = _compile(serializer, fragments=fragments)
+    if fragments and getattr(serializer, "fragment_key", None):
+        mapping = ((None, FRAGMENT, _fragment(serializer, "", mapping)),)
+    return mapping
+
+
+def lookups(mapping):
+    for _, kind, source in mapping:
+        if kind == NESTED:
+            yield from lookups(source)
+        elif kind == FRAGMENT:
+            yield from source[1]
+            yield from lookups(source[2])
+        else:
+            yield source
+
+
+def _represent_fragment(source, row):
+    name, key_lookups, mapping = source
+    key = (name, *(row[lookup] for lookup in key_lookups))
+    return fragment_cache.get_or_encode(key, lambda: represent(mapping, row))
+
+
+def represent(mapping, row):
+    """Build the serializer's representation of one values() row."""
+    if mapping and mapping[0][0] is None:
+        return _represent_fragment(mapping[0][2], row)
+    data = {}
+    for key, kind, source in mapping:
+        if kind == VALUE:
+            data[key] = row[source]
+        elif kind == NESTED:
+            data[key] = represent(source, row)
+        elif kind == FRAGMENT:
+            data[key] = _represent_fragment(source, row)
+        else:
+            value = row[source]
+            data[key] = None if value is None else bool(value)
+    return data
+
+
+class ValuesListMixin:
+    """
+    Serve list() straight from queryset.values() rows instead of building
+    the serializer's field instances for every object. The output is the
+    same; serializers with fields that can't be copied from a column raise
+    ImproperlyConfigured.
+    """
+
+    values_list_enabled = settings.VALUES_LIST_SERIALIZATION
+
+    def list(self, request, *args, **kwargs):
+        if not self.values_list_enabled:
+            return super().list(request, *args, **kwargs)
+        # Cached fragments are only understood by FastJSONRenderer
+        fragments = fragment_cache.enabled and isinstance(
+            request.accepted_renderer, FastJSONRenderer
+        )
+        mapping = values_mapping(self.get_serializer_class(), fragments)
+        names = list(lookups(mapping))
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        rows = queryset.values(*dict.fromkeys(names))
+
+        page = self.paginate_queryset(rows)
+        with timer("serialize"):
+            data = [represent(mapping, row) for row in (rows if page is None else page)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
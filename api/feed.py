@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Activity, FeedEntry, Follow
+from .tasks import task
+
+# Deletes the entries past the newest FEED_MAX_ENTRIES of each listed owner
+TRIM_SQL = """
+    DELETE FROM api_feedentry WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY owner_id ORDER BY activity_id DESC
+            ) AS position
+            FROM api_feedentry
+            WHERE owner_id = ANY(%s)
+        ) AS ranked
+        WHERE position > %s
+    )
+"""
+
+
+def reading_state_activity(record):
+    return Activity(
+        actor_id=record.reader_id,
+        verb=Activity.Verb.READING_STATE,
+        book_id=record.book_id,
+        reading_state=record.reading_state,
+    )
+
+
+def review_activity(review):
+    return Activity(
+        actor_id=review.reviewed_by_id,
+        verb=Activity.Verb.REVIEW,
+        book_id=review.book_id,
+        review=review,
+    )
+
+
+def publish(activities):
+    """
+    Save new activities and queue copying them into the timelines of their
+    actors' followers.
+    """
+    if not activities:
+        return
+    Activity.objects.bulk_create(activities)
+    fan_out_activities.delay(activity_ids=[activity.pk for activity in activities])
+
+
+@task(batch_size=100)
+def fan_out_activities(payloads):
+    """
+    Copy activities into the timeline of each of the actor's followers,
+    unless the actor has too many followers, in which case Timeline merges
+    them in when a feed is read.
+    """
+    activity_ids = [pk for payload in payloads for pk in payload["activity_ids"]]
+    activity_ids_by_actor = defaultdict(list)
+    for pk, actor_id in Activity.objects.filter(pk__in=activity_ids).values_list(
+        "pk", "actor_id"
+    ):
+        activity_ids_by_actor[actor_id].append(pk)
+    follows = Follow.objects.filter(
+        followed_id__in=activity_ids_by_actor,
+        followed__follower_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list("followed_id", "follower_id")
+
+    entries = [
+        FeedEntry(owner_id=follower_id, activity_id=activity_id)
+        for followed_id, follower_id in follows
+        for activity_id in activity_ids_by_actor[followed_id]
+    ]
+    with transaction.atomic():
+        # Conflicts are entries written by an earlier attempt
+        FeedEntry.objects.bulk_create(
+            entries, batch_size=settings.BULK_BATCH_SIZE, ignore_conflicts=True
+        )
+        # Trimming reads every listed timeline, so it is spread out rather
+        # than paid on each write; timelines overshoot the cap a little
+        if any(pk % settings.FEED_TRIM_INTERVAL == 0 for pk in activity_ids):
+            trim({entry.owner_id for entry in entries})
+
+
+def trim(owner_ids):
+    """Cap the timelines of the given users at FEED_MAX_ENTRIES."""
+    if not owner_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(TRIM_SQL, [list(owner_ids), settings.FEED_MAX_ENTRIES])
+
+
+def follow(follower, followed):
+    """
+    Make `follower` follow `followed`, seeding the follower's timeline with
+    the latest page of the followed user's activity. Returns whether a new
+    follow was created.
+    """
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(follower=follower, followed=followed)
+        if created:
+            activity_ids = Activity.objects.filter(actor=followed).order_by("-pk")
+            FeedEntry.objects.bulk_create(
+                [
+                    FeedEntry(owner=follower, activity_id=activity_id)
+                    for activity_id in activity_ids.values_list("pk", flat=True)[
+                        : settings.PAGE_SIZE
+                    ]
+                ],
+                ignore_conflicts=True,
+            )
+    return created
+
+
+def unfollow(follower, followed):
+    with transaction.atomic():
+        Follow.objects.filter(follower=follower, followed=followed).delete()
+        FeedEntry.objects.filter(owner=follower, activity__actor=followed).delete()
+
+
+class Timeline:
+    """
+    A reader's feed, newest first: their precomputed FeedEntry list merged
+    with the latest activity of the followed accounts that are not fanned
+    out. A page costs a few index scans of `size` rows, however many
+    accounts the reader follows.
+    """
+
+    def __init__(self, user, queryset):
+        self.user = user
+        self.queryset = queryset
+
+    def page(self, before, size):
+        """The `size` newest activities with a pk below `before` (if given)."""
+        entries = FeedEntry.objects.filter(owner=self.user).order_by("-activity_id")
+        if before is not None:
+            entries = entries.filter(activity_id__lt=before)
+        activity_ids = set(entries.values_list("activity_id", flat=True)[:size])
+
+        # Each account's latest activity is its own index scan; a single
+        # actor_id IN (...) query could walk the whole activity table
+        actor_ids = self.user.following.filter(
+            follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list("pk", flat=True)
+        latest = []
+        for actor_id in actor_ids:
+            activities = Activity.objects.filter(actor_id=actor_id).order_by("-pk")
+            if before is not None:
+                activities = activities.filter(pk__lt=before)
+            latest.append(activities.values_list("pk", flat=True)[:size])
+        if latest:
+            activity_ids.update(latest[0].union(*latest[1:], all=True))
+
+        activity_ids = sorted(activity_ids, reverse=True)[:size]
+        activities = self.queryset.in_bulk(activity_ids)
+        return [activities[pk] for pk in activity_ids if pk in activities]
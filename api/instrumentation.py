@@ -0,0 +1,245 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Latency bucket upper bounds in milliseconds for the endpoint histograms.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self.depth = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper(), so queries are counted
+        # without the cost of DEBUG query logging.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextmanager
+def track_queries():
+    """
+    Count the current thread's queries against the request being measured,
+    if there is one.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        yield
+
+
+@contextmanager
+def timer(name):
+    """
+    Add the time spent in the block to the named timing of the request being
+    measured. Nested blocks with the same name are only counted once.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.depth[name] -= 1
+        if not metrics.depth[name]:
+            metrics.timings[name] += time.perf_counter() - start
+
+
+class InstrumentedSerializerMixin:
+    def to_representation(self, instance):
+        with timer("serialize"):
+            return super().to_representation(instance)
+
+
+class EndpointStats:
+    """
+    Rolling per-endpoint samples for this process, kept to the last
+    REQUEST_INSTRUMENTATION_WINDOW requests of each endpoint.
+    """
+
+    FIELDS = ("total_ms", "db_ms", "serialize_ms", "render_ms", "queries", "bytes")
+
+    def __init__(self, window):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, sample):
+        with self._lock:
+            self._samples[endpoint].append(
+                tuple(sample[field] for field in self.FIELDS)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def as_dict(self):
+        with self._lock:
+            samples = {name: list(rows) for name, rows in self._samples.items()}
+        return {name: self._summarize(rows) for name, rows in samples.items()}
+
+    def _summarize(self, rows):
+        columns = dict(zip(self.FIELDS, zip(*rows)))
+        total = sorted(columns["total_ms"])
+        histogram = [0] * len(BUCKETS_MS)
+        for value in total:
+            histogram[next(i for i, le in enumerate(BUCKETS_MS) if value <= le)] += 1
+        return {
+            "count": len(rows),
+            "total_ms": {
+                "p50": total[len(total) // 2],
+                "p95": total[min(len(total) - 1, int(len(total) * 0.95))],
+                "p99": total[min(len(total) - 1, int(len(total) * 0.99))],
+                "max": total[-1],
+            },
+            "mean": {
+                field: round(sum(columns[field]) / len(rows), 2)
+                for field in self.FIELDS
+            },
+            "histogram": [
+                {"le": "+Inf" if le == float("inf") else le, "count": count}
+                for le, count in zip(BUCKETS_MS, histogram)
+            ],
+        }
+
+
+endpoint_stats = EndpointStats(settings.REQUEST_INSTRUMENTATION_WINDOW)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Record query count, DB time, serialization and render time and response
+    size for each request. The totals go into a Server-Timing header, a JSON
+    log line on the "api.instrumentation" logger and the endpoint_stats
+    served at api/request_metrics. Enabled by REQUEST_INSTRUMENTATION.
+
+    Streaming responses are recorded once their last chunk has been sent,
+    with the bytes counted as they stream. Under ASGI the middleware runs
+    on the event loop rather than confining requests to one thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with track_queries():
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total = time.perf_counter() - start
+        response["Server-Timing"] = ", ".join(
+            (
+                f"db;dur={metrics.db_time * 1000:.2f};"
+                f'desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.timings["serialize"] * 1000:.2f}',
+                f'render;dur={metrics.timings["render"] * 1000:.2f}',
+                f"total;dur={total * 1000:.2f}",
+            )
+        )
+        if response.streaming:
+            response.streaming_content = self.count_streamed(
+                response.streaming_content, request, response, metrics, start
+            )
+        else:
+            self.record(request, response, metrics, total, len(response.content))
+        return response
+
+    def count_streamed(self, chunks, request, response, metrics, start):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, response, metrics, time.perf_counter() - start, size)
+
+    def record(self, request, response, metrics, total, size):
+        match = request.resolver_match
+        endpoint = f"{request.method} {match.view_name if match else 'unresolved'}"
+        sample = {
+            "total_ms": round(total * 1000, 2),
+            "db_ms": round(metrics.db_time * 1000, 2),
+            "serialize_ms": round(metrics.timings["serialize"] * 1000, 2),
+            "render_ms": round(metrics.timings["render"] * 1000, 2),
+            "queries": metrics.queries,
+            "bytes": size,
+        }
+        endpoint_stats.add(endpoint, sample)
+        logger.info(
+            json.dumps(
+                {
+                    "endpoint": endpoint,
+                    "path": request.path,
+                    "status": response.status_code,
+                    **sample,
+                }
+            )
+        )
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time it.
+        metrics = _current.get()
+        if metrics is not None and not response.is_rendered:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.timings["render"] += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,173 @@
+import platform
+import random
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import (
+    BENCHMARK_USERNAME,
+    benchmark_urls,
+    compare,
+    load_results,
+    run_in_process,
+    run_over_http,
+    save_results,
+    seeded_test_database,
+    unthrottled,
+)
+from api.models import Book, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the API endpoints against a seeded dataset and report "
+        "requests per second, latency percentiles, queries per request and "
+        "peak RSS. Results can be saved as a JSON baseline and compared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--records", type=int, default=100_000)
+        parser.add_argument("--reviews", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Only run the named endpoint. Can be repeated.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the seeded test database between runs.",
+        )
+        parser.add_argument(
+            "--base-url",
+            help=(
+                "Benchmark a running server (e.g. http://127.0.0.1:8000) "
+                "instead of the in-process test client. The server must use "
+                "the same database, seeded with seed_library."
+            ),
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--save", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Compare against this JSON baseline.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="Relative change that counts as a regression (default 0.1).",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error if any metric regressed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["base_url"]:
+            if not Book.objects.exists():
+                raise CommandError("Run seed_library before benchmarking a server.")
+            results = self.run(options, over_http=True)
+        else:
+            results = self.run_against_test_database(options)
+
+        self.report(results)
+        if options["save"]:
+            save_results(options["save"], results)
+            self.stdout.write(f"Saved results to {options['save']}")
+        if options["compare"]:
+            regressed = self.report_comparison(
+                load_results(options["compare"]), results, options["threshold"]
+            )
+            if regressed and options["fail_on_regression"]:
+                raise CommandError("Benchmark regressed against the baseline.")
+
+    def run_against_test_database(self, options):
+        with unthrottled(), seeded_test_database(
+            keepdb=options["keepdb"],
+            seed=options["seed"],
+            log=self.stdout.write,
+            books=options["books"],
+            users=options["users"],
+            records=options["records"],
+            reviews=options["reviews"],
+        ):
+            return self.run(options, over_http=False)
+
+    def run(self, options, over_http):
+        rng = random.Random(options["seed"])
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        token, _ = Token.objects.get_or_create(user=user)
+        urls = benchmark_urls(rng)
+        names = options["endpoints"] or list(urls)
+        unknown = set(names) - set(urls)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        endpoints = {}
+        for name in names:
+            self.stdout.write(f"Running {name}...")
+            if over_http:
+                endpoints[name] = run_over_http(
+                    urls[name],
+                    token.key,
+                    options["requests"],
+                    options["warmup"],
+                    options["base_url"].rstrip("/"),
+                    options["concurrency"],
+                )
+            else:
+                endpoints[name] = run_in_process(
+                    urls[name], token.key, options["requests"], options["warmup"]
+                )
+        return {
+            "meta": {
+                "date": datetime.now(timezone.utc).isoformat(),
+                "target": options["base_url"] or "in-process",
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "books": Book.objects.count(),
+                "requests": options["requests"],
+            },
+            "endpoints": endpoints,
+        }
+
+    def report(self, results):
+        columns = (
+            "rps",
+            "p50_ms",
+            "p95_ms",
+            "p99_ms",
+            "queries_per_request",
+            "peak_rss_growth_kb",
+        )
+        self.stdout.write(
+            f"{'endpoint':<16}"
+            + "".join(f"{column:>20}" for column in columns)
+            + f"{'errors':>8}"
+        )
+        for name, metrics in results["endpoints"].items():
+            self.stdout.write(
+                f"{name:<16}"
+                + "".join(f"{metrics.get(column, '-'):>20}" for column in columns)
+                + f"{metrics['errors']:>8}"
+            )
+
+    def report_comparison(self, baseline, results, threshold):
+        regressed = False
+        for name, metric, old, new, worse in compare(baseline, results, threshold):
+            line = f"{name:<16}{metric:<22}{old:>12} -> {new:<12}"
+            if worse:
+                regressed = True
+                self.stdout.write(self.style.ERROR(f"{line} REGRESSED"))
+            else:
+                self.stdout.write(line)
+        return regressed
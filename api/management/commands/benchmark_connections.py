@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import (
+    BENCHMARK_USERNAME,
+    benchmark_urls,
+    seeded_test_database,
+    summarize,
+    unthrottled,
+)
+from api.models import User
+
+# Endpoints that always reach the database; the cached ones would mostly
+# not open a connection at all.
+DEFAULT_ENDPOINTS = ["book-records", "book-reviews", "books-popular"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request latency with a new database connection per request, "
+        "persistent connections (CONN_MAX_AGE) and the connection pool (POOL), "
+        "closing connections after each request as a server would."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=2_000)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--records", type=int, default=20_000)
+        parser.add_argument("--reviews", type=int, default=20_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Client threads, each with its own connection (default 4).",
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Only run the named endpoint. Can be repeated.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the seeded test database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("benchmark_connections requires PostgreSQL.")
+        if not hasattr(connection, "close_pool"):
+            raise CommandError("Set the database ENGINE to api.db.postgresql.")
+
+        modes = {
+            "new-per-request": {"CONN_MAX_AGE": 0, "POOL": None},
+            "persistent": {"CONN_MAX_AGE": 600, "POOL": None},
+            "pooled": {
+                "CONN_MAX_AGE": 0,
+                "POOL": {
+                    "size": options["concurrency"],
+                    "max_overflow": 0,
+                    "timeout": 10,
+                },
+            },
+        }
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in ("CONN_MAX_AGE", "POOL")}
+        with unthrottled(), seeded_test_database(
+            keepdb=options["keepdb"],
+            seed=options["seed"],
+            log=self.stdout.write,
+            books=options["books"],
+            users=options["users"],
+            records=options["records"],
+            reviews=options["reviews"],
+        ):
+            try:
+                results = self.run(options, modes)
+            finally:
+                connection.close()
+                connection.close_pool()
+                settings_dict.update(saved)
+        self.report(results)
+
+    def run(self, options, modes):
+        rng = random.Random(options["seed"])
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        token, _ = Token.objects.get_or_create(user=user)
+        urls = benchmark_urls(rng)
+        names = options["endpoints"] or DEFAULT_ENDPOINTS
+        unknown = set(names) - set(urls)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        # Start every mode without a connection left over from seeding
+        connection.close()
+
+        results = {}
+        for name in names:
+            for mode, mode_settings in modes.items():
+                self.stdout.write(f"Running {name} ({mode})...")
+                connection.settings_dict.update(mode_settings)
+                results[name, mode] = self.run_mode(
+                    urls[name], token.key, options["requests"], options
+                )
+                connection.close_pool()
+        return results
+
+    def run_mode(self, make_url, token, requests, options):
+        headers = {"HTTP_AUTHORIZATION": f"Token {token}"}
+        urls = [make_url() for _ in range(requests)]
+        concurrency = options["concurrency"]
+        timings, errors = [], []
+        lock = threading.Lock()
+
+        def serve(url, client):
+            # The test client leaves connections alone, so close them around
+            # each request the way the request_started and request_finished
+            # signals do under a real server.
+            request_start = time.perf_counter()
+            close_old_connections()
+            try:
+                response = client.get(url, **headers)
+            finally:
+                close_old_connections()
+            return time.perf_counter() - request_start, response.status_code >= 400
+
+        def worker(share):
+            client = Client(raise_request_exception=False)
+            try:
+                for _ in range(options["warmup"]):
+                    serve(make_url(), client)
+            except BaseException:
+                barrier.abort()
+                raise
+            try:
+                barrier.wait()
+                results = [serve(url, client) for url in share]
+            finally:
+                connection.close()
+            with lock:
+                timings.extend(timing for timing, _ in results)
+                errors.extend(failed for _, failed in results)
+
+        barrier = threading.Barrier(concurrency + 1)
+        threads = [
+            threading.Thread(target=worker, args=(urls[index::concurrency],))
+            for index in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            for thread in threads:
+                thread.join()
+            raise CommandError("A client thread failed during warmup.")
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return summarize(timings, time.perf_counter() - start, sum(errors))
+
+    def report(self, results):
+        columns = ("rps", "p50_ms", "p95_ms", "p99_ms")
+        self.stdout.write(
+            f"{'endpoint':<16}{'mode':<18}"
+            + "".join(f"{column:>10}" for column in columns)
+            + f"{'errors':>8}"
+        )
+        for (name, mode), metrics in results.items():
+            self.stdout.write(
+                f"{name:<16}{mode:<18}"
+                + "".join(f"{metrics[column]:>10}" for column in columns)
+                + f"{metrics['errors']:>8}"
+            )
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmarks import WORDS, seed_library
+from api.models import User
+from api.views import BookViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed books and reviews inside a rolled back transaction and time "
+        "GET /api/books?search=... against the stored search document."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--reviews", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            seed_library(
+                rng,
+                books=options["books"],
+                reviews=options["reviews"],
+                batch_size=options["batch_size"],
+                log=self.stdout.write,
+            )
+            timings = self.run_queries(rng, options["queries"])
+            transaction.set_rollback(True)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{len(timings)} searches over {options['books']} books / "
+            f"{options['reviews']} reviews: "
+            f"median {statistics.median(timings):.1f}ms, "
+            f"p95 {p95:.1f}ms, max {timings[-1]:.1f}ms"
+        )
+
+    def run_queries(self, rng, count):
+        user = User.objects.create(username="benchmark_search")
+        view = BookViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        timings = []
+        for _ in range(count):
+            request = factory.get("/api/books", {"search": rng.choice(WORDS)})
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
@@ -0,0 +1,95 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import lookups, represent, values_mapping
+from api.renderers import FastJSONRenderer, fragment_cache
+from api.models import Book, BookRecord
+from api.serializers import BookRecordSerializer, BookSerializer
+
+CASES = {
+    "books": (BookSerializer, Book.objects.order_by("title", "pk")),
+    "book_records": (
+        BookRecordSerializer,
+        BookRecord.objects.order_by("-created_at", "-pk"),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the same rows through the DRF serializers, the values() fast "
+        "path, FastJSONRenderer and (when enabled) cached fragments, check "
+        "the JSON is identical and time each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+        for name, (serializer_class, queryset) in CASES.items():
+            queryset = queryset[: options["rows"]]
+            mapping = values_mapping(serializer_class)
+            fragment_mapping = values_mapping(serializer_class, fragments=True)
+
+            def serializer_path():
+                instances = serializer_class.setup_eager_loading(queryset)
+                return renderer.render(serializer_class(instances, many=True).data)
+
+            def values_path():
+                rows = queryset.values(*dict.fromkeys(lookups(mapping)))
+                return renderer.render([represent(mapping, row) for row in rows])
+
+            def fast_renderer_path():
+                rows = queryset.values(*dict.fromkeys(lookups(mapping)))
+                return fast_renderer.render([represent(mapping, row) for row in rows])
+
+            def fragments_path():
+                rows = queryset.values(*dict.fromkeys(lookups(fragment_mapping)))
+                return fast_renderer.render(
+                    [represent(fragment_mapping, row) for row in rows]
+                )
+
+            fragment_cache.clear()
+            expected = serializer_path()
+            if values_path() != expected:
+                raise CommandError(f"{name}: the fast path output differs.")
+            if fast_renderer_path() != expected:
+                raise CommandError(f"{name}: the FastJSONRenderer output differs.")
+            if fragment_cache.enabled and (
+                fragments_path() != expected or fragments_path() != expected
+            ):
+                raise CommandError(f"{name}: the fragment output differs.")
+            if expected == b"[]":
+                self.stdout.write(f"{name}: no rows, run seed_library first.")
+                continue
+
+            slow = self.time(serializer_path, options["repeat"])
+            timings = {
+                "values()": self.time(values_path, options["repeat"]),
+                "+ FastJSONRenderer": self.time(fast_renderer_path, options["repeat"]),
+            }
+            if fragment_cache.enabled:
+                timings["+ cached fragments"] = self.time(
+                    fragments_path, options["repeat"]
+                )
+            self.stdout.write(
+                f"{name}: {options['rows']} rows, serializer {slow:.2f}ms, "
+                + ", ".join(
+                    f"{label} {timing:.2f}ms ({slow / timing:.1f}x)"
+                    for label, timing in timings.items()
+                )
+            )
+
+    def time(self, render, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,106 @@
+import io
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from scipy import sparse
+
+from api.models import BookRecord
+from api.recommendations import READER_STATES
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild api_similarbook: the SIMILAR_BOOKS_TOP_K nearest neighbours "
+        "of every book by cosine similarity of the sets of users who read or "
+        "are reading it, computed from a sparse reader-by-book matrix."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2_000,
+            help="Books whose co-occurrence row is computed at once.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("build_similar_books requires PostgreSQL")
+
+        start = time.monotonic()
+        pairs = np.array(
+            list(
+                BookRecord.objects.filter(reading_state__in=READER_STATES)
+                .order_by()
+                .values_list("reader_id", "book_id")
+                .distinct()
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        reader_ids, reader_index = np.unique(pairs[:, 0], return_inverse=True)
+        book_ids, book_index = np.unique(pairs[:, 1], return_inverse=True)
+        self.stdout.write(
+            f"{len(pairs)} readings of {len(book_ids)} books by "
+            f"{len(reader_ids)} readers"
+        )
+
+        # Readers by books, 1 where the reader read or is reading the book
+        readings = sparse.csr_matrix(
+            (np.ones(len(pairs)), (reader_index, book_index)),
+            shape=(len(reader_ids), len(book_ids)),
+        )
+        books = readings.T.tocsr()
+        readers_per_book = np.asarray(readings.sum(axis=0)).ravel()
+
+        buffer = io.StringIO()
+        rows = 0
+        for first in range(0, len(book_ids), options["chunk_size"]):
+            # Readers each book in the chunk shares with every other book
+            co_readers = (
+                books[first : first + options["chunk_size"]] @ readings
+            ).tocoo()
+            neighbours = self.top_neighbours(
+                co_readers.row + first,
+                co_readers.col,
+                co_readers.data,
+                readers_per_book,
+            )
+            for book, similar, score in zip(*neighbours):
+                buffer.write(f"{book_ids[book]}\t{book_ids[similar]}\t{score}\n")
+            rows += len(neighbours[0])
+
+        buffer.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_similarbook")
+            cursor.copy_expert(
+                "COPY api_similarbook (book_id, similar_id, score) FROM STDIN", buffer
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {rows} neighbours in {time.monotonic() - start:.1f}s"
+            )
+        )
+
+    def top_neighbours(self, books, others, co_readers, readers_per_book):
+        """
+        The top SIMILAR_BOOKS_TOP_K (book, other, score) entries of each
+        book, as three arrays, from the co-reader counts of (book, other).
+        """
+        min_co_readers = settings.SIMILAR_BOOKS_MIN_CO_READERS
+        keep = (books != others) & (co_readers >= min_co_readers)
+        books, others, co_readers = books[keep], others[keep], co_readers[keep]
+        scores = co_readers / np.sqrt(
+            readers_per_book[books] * readers_per_book[others]
+        )
+
+        # Sort by book, best score first, and keep each book's first K
+        order = np.lexsort((others, -scores, books))
+        books, others, scores = books[order], others[order], scores[order]
+        group_starts = np.flatnonzero(np.r_[True, books[1:] != books[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(books)])
+        positions = np.arange(len(books)) - np.repeat(group_starts, group_sizes)
+        top = positions < settings.SIMILAR_BOOKS_TOP_K
+        return books[top], others[top], scores[top]
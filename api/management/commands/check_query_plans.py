@@ -0,0 +1,112 @@
+import json
+import random
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import benchmark_urls, seeded_test_database
+from api.models import User
+
+
+def seq_scans(plan):
+    """Yield the relation of every sequential scan in an EXPLAIN plan tree."""
+    if plan["Node Type"] == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database, request each API endpoint, EXPLAIN every query "
+        "it runs and fail if any of them sequentially scans a large table, or "
+        "if an endpoint doesn't answer with a 2xx status."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=50_000)
+        parser.add_argument("--users", type=int, default=5_000)
+        parser.add_argument("--records", type=int, default=500_000)
+        parser.add_argument("--reviews", type=int, default=200_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10_000,
+            help="Only report sequential scans of tables at least this large.",
+        )
+        parser.add_argument("--keepdb", action="store_true")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("check_query_plans needs a PostgreSQL database.")
+        with seeded_test_database(
+            keepdb=options["keepdb"],
+            seed=options["seed"],
+            log=self.stdout.write,
+            books=options["books"],
+            users=options["users"],
+            records=options["records"],
+            reviews=options["reviews"],
+        ):
+            failed, problems = self.explain_endpoints(options)
+        if failed:
+            raise CommandError(f"Endpoints failed: {', '.join(failed)}.")
+        if problems:
+            raise CommandError(
+                f"{len(problems)} queries scan large tables sequentially."
+            )
+        self.stdout.write(self.style.SUCCESS("No sequential scans of large tables."))
+
+    def explain_endpoints(self, options):
+        table_sizes = self.table_sizes()
+        # A reader with records, so the reading log queries have rows to find
+        reader = User.objects.filter(book_records__isnull=False).first()
+        token, _ = Token.objects.get_or_create(user=reader)
+        client = Client(raise_request_exception=False)
+        failed, problems = [], []
+        for name, make_url in benchmark_urls(random.Random(options["seed"])).items():
+            for alias in ("book_responses", "auth_tokens"):
+                caches[alias].clear()
+            url = make_url()
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url, HTTP_AUTHORIZATION=f"Token {token.key}")
+            self.stdout.write(f"{name} {url} -> {response.status_code}")
+            # An error page's queries say nothing about the endpoint's plans
+            if not 200 <= response.status_code < 300:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"  {name} failed"))
+                continue
+
+            for query in captured:
+                sql = query["sql"]
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                large = [
+                    table
+                    for table in seq_scans(plan[0]["Plan"])
+                    if table_sizes.get(table, 0) >= options["min_rows"]
+                ]
+                if large:
+                    problems.append((name, sql, large))
+                    self.stdout.write(
+                        self.style.ERROR(f"  Seq Scan on {', '.join(large)}: {sql}")
+                    )
+        return failed, problems
+
+    def table_sizes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class "
+                "WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+            )
+            return dict(cursor.fetchall())
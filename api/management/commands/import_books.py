@@ -0,0 +1,162 @@
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import book_response_cache
+from api.models import Book, BookStats
+
+STAGING_TABLE = "api_book_import"
+
+MERGE_SQL = f"""
+    INSERT INTO api_book (
+        title, author, publication_year, featured, created_at, updated_at
+    )
+    SELECT DISTINCT ON (title, author)
+        title, author, publication_year, false, now(), now()
+    FROM {STAGING_TABLE}
+    ORDER BY title, author, line_number DESC
+    ON CONFLICT (title, author) DO UPDATE
+        SET publication_year = COALESCE(
+                EXCLUDED.publication_year, api_book.publication_year
+            ),
+            updated_at = EXCLUDED.updated_at
+    RETURNING id
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books from a CSV or JSON lines file (title, author, "
+        "publication_year). Rows are loaded in batches with COPY into a "
+        "staging table and upserted into api_book on (title, author)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--rejects", help="Write rejected rows with the reason to this CSV file"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("import_books requires PostgreSQL")
+
+        file_format = options["format"] or (
+            "jsonl" if options["path"].endswith((".jsonl", ".ndjson")) else "csv"
+        )
+        source = (
+            sys.stdin
+            if options["path"] == "-"
+            else open(options["path"], newline="", encoding="utf-8")
+        )
+        rejects_file = (
+            open(options["rejects"], "w", newline="", encoding="utf-8")
+            if options["rejects"]
+            else None
+        )
+        rejects = csv.writer(rejects_file) if rejects_file else None
+
+        self.title_field = Book._meta.get_field("title")
+        self.author_field = Book._meta.get_field("author")
+        self.year_field = Book._meta.get_field("publication_year")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ("
+                "line_number integer, title varchar(255), author varchar(255), "
+                "publication_year smallint) ON COMMIT DELETE ROWS"
+            )
+
+        processed = imported = rejected = 0
+        start = time.monotonic()
+        try:
+            rows = self.read_rows(source, file_format)
+            while True:
+                batch = list(itertools.islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                processed += len(batch)
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for line_number, row in batch:
+                    try:
+                        writer.writerow([line_number, *self.clean_row(row)])
+                    except ValidationError as exc:
+                        rejected += 1
+                        if rejects:
+                            rejects.writerow([line_number, "; ".join(exc.messages)])
+                imported += self.merge(buffer)
+
+                self.stdout.write(self.progress(processed, imported, rejected, start))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if rejects_file:
+                rejects_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(self.progress(processed, imported, rejected, start))
+        )
+
+    def progress(self, processed, imported, rejected, start):
+        elapsed = time.monotonic() - start
+        return (
+            f"{processed} rows read, {imported} books imported, {rejected} rejected "
+            f"in {elapsed:.1f}s ({processed / elapsed:.0f} rows/s)"
+        )
+
+    def read_rows(self, source, file_format):
+        if file_format == "csv":
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row
+
+    def clean_row(self, row):
+        if not isinstance(row, dict):
+            raise ValidationError("Not a valid JSON object")
+        title = self.title_field.clean(str(row.get("title") or "").strip(), None)
+        author = self.author_field.clean(str(row.get("author") or "").strip(), None)
+        year = row.get("publication_year")
+        try:
+            year = int(year) if year not in (None, "") else None
+        except (TypeError, ValueError):
+            raise ValidationError(f"Invalid publication_year {year!r}")
+        return title, author, self.year_field.clean(year, None)
+
+    def merge(self, buffer):
+        buffer.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {STAGING_TABLE} (line_number, title, author, publication_year) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(MERGE_SQL)
+            book_ids = [book_id for (book_id,) in cursor.fetchall()]
+            Book.objects.filter(pk__in=book_ids).update_search_document()
+            BookStats.objects.bulk_create(
+                [BookStats(book_id=book_id) for book_id in book_ids],
+                ignore_conflicts=True,
+            )
+
+        book_response_cache.invalidate(
+            "books", "reviews", *(f"book:{book_id}" for book_id in book_ids)
+        )
+        return len(book_ids)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Book, BookStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount every book's reading-state and review counters from "
+        "api_bookrecord and api_bookreview. Run periodically to repair drift "
+        "in the incrementally maintained api_bookstats table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        book_ids = Book.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk, reconciled = 0, 0
+        while True:
+            batch = list(book_ids.filter(pk__gt=last_pk)[: options["batch_size"]])
+            if not batch:
+                break
+            BookStats.objects.reconcile(batch)
+            last_pk = batch[-1]
+            reconciled += len(batch)
+            self.stdout.write(f"Reconciled {reconciled} books")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled stats for {reconciled} books")
+        )
@@ -0,0 +1,50 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.tasks import DatabaseBackend
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background tasks queued by api.tasks.DatabaseBackend. Start as "
+        "many workers as needed; they share the queue without running a task "
+        "twice. Stops after the current batch on SIGINT or SIGTERM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when no task is due (default 1).",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no task is due instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+
+        backend = DatabaseBackend()
+        processed = 0
+        while not self.stopping:
+            # Apply CONN_MAX_AGE and health checks as a request would
+            close_old_connections()
+            ran = backend.run_next()
+            processed += ran
+            if ran:
+                continue
+            if options["burst"]:
+                break
+            time.sleep(options["poll_interval"])
+        self.stdout.write(f"Ran {processed} tasks.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
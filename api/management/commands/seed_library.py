@@ -0,0 +1,30 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks import seed_library
+
+
+class Command(BaseCommand):
+    help = "Fill the database with generated books, readers, records and reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--records", type=int, default=100_000)
+        parser.add_argument("--reviews", type=int, default=100_000)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seed_library(
+                random.Random(options["seed"]),
+                books=options["books"],
+                users=options["users"],
+                records=options["records"],
+                reviews=options["reviews"],
+                batch_size=options["batch_size"],
+                log=self.stdout.write,
+            )
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:48
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def populate_search_document(apps, schema_editor):
+    Book = apps.get_model("api", "Book")
+    BookReview = apps.get_model("api", "BookReview")
+    review_text = (
+        BookReview.objects.filter(book=OuterRef("pk"))
+        .order_by()
+        .values("book")
+        .annotate(
+            text=StringAgg("body", delimiter=" ", output_field=models.TextField())
+        )
+        .values("text")
+    )
+    Book.objects.update(
+        search_document=SearchVector("title", weight="A")
+        + SearchVector("author", weight="B")
+        + SearchVector(Subquery(review_text), weight="C")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_user_photo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="search_document",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="bookreview",
+            name="book",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reviews",
+                to="api.book",
+            ),
+        ),
+        migrations.RunPython(populate_search_document, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="book",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_document"], name="book_search_gin"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_book_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookStats",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="api.book",
+                    ),
+                ),
+                ("want_to_read_count", models.IntegerField(default=0)),
+                ("reading_count", models.IntegerField(default=0)),
+                ("read_count", models.IntegerField(default=0)),
+                ("review_count", models.IntegerField(default=0)),
+                ("popularity", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO api_bookstats (
+                book_id, want_to_read_count, reading_count, read_count,
+                review_count, popularity
+            )
+            SELECT book_id, want_to_read, reading, read, reviews,
+                want_to_read + reading + read + reviews
+            FROM (
+                SELECT
+                    b.id AS book_id,
+                    (SELECT COUNT(*) FROM api_bookrecord r
+                     WHERE r.book_id = b.id AND r.reading_state = 'wr') AS want_to_read,
+                    (SELECT COUNT(*) FROM api_bookrecord r
+                     WHERE r.book_id = b.id AND r.reading_state = 'rg') AS reading,
+                    (SELECT COUNT(*) FROM api_bookrecord r
+                     WHERE r.book_id = b.id AND r.reading_state = 'rd') AS read,
+                    (SELECT COUNT(*) FROM api_bookreview v
+                     WHERE v.book_id = b.id) AS reviews
+                FROM api_book b
+            ) AS counts
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="bookstats",
+            index=models.Index(
+                fields=["popularity", "book"], name="book_stats_popularity"
+            ),
+        ),
+    ]
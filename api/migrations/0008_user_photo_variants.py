@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_book_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="photo_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "pending"),
+                    ("ready", "ready"),
+                    ("failed", "failed"),
+                ],
+                max_length=7,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="photo_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the tables against writes
+    atomic = False
+
+    dependencies = [
+        ("api", "0008_user_photo_variants"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="book",
+            index=models.Index(fields=["title", "id"], name="book_title_id"),
+        ),
+        AddIndexConcurrently(
+            model_name="book",
+            index=models.Index(
+                condition=models.Q(("featured", True)),
+                fields=["title", "id"],
+                name="book_featured_title_id",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="bookrecord",
+            index=models.Index(
+                fields=["reader", "-created_at", "-id"],
+                name="book_record_reader_created",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="bookrecord",
+            index=models.Index(
+                fields=["reader", "updated_at"], name="book_record_reader_updated"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="bookreview",
+            index=models.Index(fields=["book", "-id"], name="book_review_book_id"),
+        ),
+        AddIndexConcurrently(
+            model_name="bookreview",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector("body", config="english"),
+                name="book_review_body_search",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:07
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    BookReview = apps.get_model("api", "BookReview")
+    BookReview.objects.update(search_vector=SearchVector("body", config="english"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookreview",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:07
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the new index without locking reviews against writes, and only
+    # then drop the expression index it replaces
+    atomic = False
+
+    dependencies = [
+        ("api", "0010_bookreview_search_vector"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="bookreview",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="book_review_search_gin"
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="bookreview",
+            name="book_review_body_search",
+        ),
+    ]
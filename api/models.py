@@ -1,12 +1,82 @@
 import datetime
-from django.db import models
+import uuid
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db.models.constraints import UniqueConstraint
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
 
 class User(AbstractUser):
+    class PhotoStatus(models.TextChoices):
+        PENDING = "pending", "pending"
+        READY = "ready", "ready"
+        FAILED = "failed", "failed"
+
     photo = models.ImageField(upload_to="user_profile_photos", null=True, blank=True)
+    photo_status = models.CharField(
+        max_length=7, choices=PhotoStatus.choices, null=True, blank=True
+    )
+    # Storage names of the resized copies made by api/photos.py, keyed by
+    # size and then format, e.g. {"small": {"webp": "...", "jpeg": "..."}}
+    photo_variants = models.JSONField(default=dict, blank=True)
+    following = models.ManyToManyField(
+        "self",
+        through="Follow",
+        through_fields=("follower", "followed"),
+        symmetrical=False,
+        related_name="followers",
+    )
+    # Maintained by the signal handlers in api/signals.py; decides whether
+    # this user's activity is fanned out to followers (see api/feed.py)
+    follower_count = models.IntegerField(default=0, editable=False)
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+        to="User", on_delete=models.CASCADE, related_name="following_links"
+    )
+    followed = models.ForeignKey(
+        to="User", on_delete=models.CASCADE, related_name="follower_links"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=["follower", "followed"], name="unique_follow"),
+            models.CheckConstraint(
+                check=~Q(follower=F("followed")), name="follow_not_self"
+            ),
+        ]
+        indexes = [
+            # Followers to fan an activity out to
+            models.Index(fields=["followed", "follower"], name="follow_followed"),
+        ]
+
+    def __repr__(self):
+        return f"<Follow follower_pk={self.follower_id} followed_pk={self.followed_id}>"
+
+
+class BookQuerySet(models.QuerySet):
+    def update_search_document(self):
+        review_text = (
+            BookReview.objects.filter(book=OuterRef("pk"))
+            .order_by()
+            .values("book")
+            .annotate(
+                text=StringAgg("body", delimiter=" ", output_field=models.TextField())
+            )
+            .values("text")
+        )
+        return self.update(
+            search_document=SearchVector("title", weight="A")
+            + SearchVector("author", weight="B")
+            + SearchVector(Subquery(review_text), weight="C")
+        )
 
 
 class Book(models.Model):
@@ -23,11 +93,26 @@ class Book(models.Model):
     featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    # Weighted title (A), author (B) and review text (C), maintained by the
+    # signal handlers in api/signals.py.
+    search_document = SearchVectorField(null=True, editable=False)
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         constraints = [
             UniqueConstraint(fields=["title", "author"], name="unique_by_author")
         ]
+        indexes = [
+            GinIndex(fields=["search_document"], name="book_search_gin"),
+            # Keyset pagination of the book list and of featured books
+            models.Index(fields=["title", "id"], name="book_title_id"),
+            models.Index(
+                fields=["title", "id"],
+                condition=Q(featured=True),
+                name="book_featured_title_id",
+            ),
+        ]
 
     def __repr__(self):
         return f"<Book title={self.title} pk={self.pk}>"
@@ -54,6 +139,19 @@ class BookRecord(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # A reader's records in pagination order, and their latest
+            # change for the list's ETag
+            models.Index(
+                fields=["reader", "-created_at", "-id"],
+                name="book_record_reader_created",
+            ),
+            models.Index(
+                fields=["reader", "updated_at"], name="book_record_reader_updated"
+            ),
+        ]
+
     def __repr__(self):
         return f"<BookRecord pk={self.pk} reader_pk={self.reader.pk} book_pk={self.book.pk}>"
 
@@ -61,6 +159,13 @@ class BookRecord(models.Model):
         return f"{self.reader.username} {self.reading_state}: {self.book.title}"
 
 
+class BookReviewQuerySet(models.QuerySet):
+    def update_search_vector(self):
+        return self.update(
+            search_vector=SearchVector("body", config=BookReview.SEARCH_CONFIG)
+        )
+
+
 class BookReview(models.Model):
     body = models.TextField()
     book = models.ForeignKey(
@@ -70,6 +175,21 @@ class BookReview(models.Model):
         to="User", on_delete=models.SET_NULL, blank=True, null=True
     )
 
+    # The body as a tsvector, maintained by the signal handlers in
+    # api/signals.py.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Text search configuration of search_vector and of review ?search=
+    SEARCH_CONFIG = "english"
+
+    objects = BookReviewQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["book", "-id"], name="book_review_book_id"),
+            GinIndex(fields=["search_vector"], name="book_review_search_gin"),
+        ]
+
     def __repr__(self):
         return (
             f"<BookReview pk={self.pk} book={self.book} reviewed_by={self.reviewed_by}>"
@@ -77,3 +197,219 @@ class BookReview(models.Model):
 
     def __str__(self):
         return f"Review of {self.book.title}"
+
+
+class BookStatsQuerySet(models.QuerySet):
+    def apply_delta(self, book_id, **deltas):
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.filter(book_id=book_id).update(
+            popularity=F("popularity") + sum(deltas.values()),
+            **{field: F(field) + delta for field, delta in deltas.items()},
+        )
+
+    def reconcile(self, book_ids):
+        """
+        Recount the stats of the given books from api_bookrecord and
+        api_bookreview, replacing whatever the incremental updates left.
+        """
+        stats = {book_id: BookStats(book_id=book_id) for book_id in book_ids}
+        records = (
+            BookRecord.objects.filter(book_id__in=stats, reading_state__isnull=False)
+            .order_by()
+            .values_list("book_id", "reading_state")
+            .annotate(count=Count("pk"))
+        )
+        for book_id, reading_state, count in records:
+            setattr(stats[book_id], BookStats.STATE_FIELDS[reading_state], count)
+        reviews = (
+            BookReview.objects.filter(book_id__in=stats)
+            .order_by()
+            .values_list("book_id")
+            .annotate(count=Count("pk"))
+        )
+        for book_id, count in reviews:
+            stats[book_id].review_count = count
+        for book_stats in stats.values():
+            book_stats.popularity = sum(
+                getattr(book_stats, field) for field in BookStats.COUNT_FIELDS
+            )
+
+        existing_book_ids = Book.objects.filter(pk__in=stats).values_list(
+            "pk", flat=True
+        )
+        with transaction.atomic():
+            self.filter(book_id__in=stats).delete()
+            self.bulk_create(
+                [stats[book_id] for book_id in existing_book_ids],
+                batch_size=1000,
+            )
+
+
+class BookStats(models.Model):
+    STATE_FIELDS = {
+        BookRecord.ReadingState.WANT_TO_READ: "want_to_read_count",
+        BookRecord.ReadingState.READING: "reading_count",
+        BookRecord.ReadingState.READ: "read_count",
+    }
+    COUNT_FIELDS = (*STATE_FIELDS.values(), "review_count")
+
+    book = models.OneToOneField(
+        to="Book", on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    want_to_read_count = models.IntegerField(default=0)
+    reading_count = models.IntegerField(default=0)
+    read_count = models.IntegerField(default=0)
+    review_count = models.IntegerField(default=0)
+    # Readers in any state plus reviews, kept in its own indexed column so
+    # /api/books/popular is an index scan
+    popularity = models.IntegerField(default=0)
+
+    objects = BookStatsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["popularity", "book"], name="book_stats_popularity")
+        ]
+
+    def __repr__(self):
+        return f"<BookStats book_pk={self.book_id} popularity={self.popularity}>"
+
+
+class SimilarBook(models.Model):
+    """
+    One of a book's nearest neighbours by co-readership, built by the
+    build_similar_books command and refreshed by api/recommendations.py.
+    """
+
+    book = models.ForeignKey(
+        to="Book", on_delete=models.CASCADE, related_name="similar_books"
+    )
+    similar = models.ForeignKey(
+        to="Book", on_delete=models.CASCADE, related_name="similar_to"
+    )
+    # Cosine similarity of the two books' sets of readers
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["book", "-score"], name="similar_book_score"),
+        ]
+
+    def __repr__(self):
+        return f"<SimilarBook book_pk={self.book_id} similar_pk={self.similar_id}>"
+
+
+class Activity(models.Model):
+    class Verb(models.TextChoices):
+        READING_STATE = "state", "changed reading state"
+        REVIEW = "review", "reviewed"
+
+    actor = models.ForeignKey(
+        to="User", on_delete=models.CASCADE, related_name="activities"
+    )
+    verb = models.CharField(max_length=6, choices=Verb.choices)
+    book = models.ForeignKey(to="Book", on_delete=models.CASCADE, related_name="+")
+    reading_state = models.CharField(
+        max_length=2, choices=BookRecord.ReadingState.choices, null=True, blank=True
+    )
+    review = models.ForeignKey(
+        to="BookReview",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # An account's latest activity, merged into its followers' feeds
+            # when it has too many followers to fan out to
+            models.Index(fields=["actor", "-id"], name="activity_actor_id"),
+        ]
+
+    def __repr__(self):
+        return f"<Activity pk={self.pk} actor_pk={self.actor_id} verb={self.verb}>"
+
+
+class FeedEntry(models.Model):
+    """One activity in a reader's precomputed timeline."""
+
+    owner = models.ForeignKey(to="User", on_delete=models.CASCADE, related_name="+")
+    activity = models.ForeignKey(
+        to="Activity", on_delete=models.CASCADE, related_name="+"
+    )
+
+    class Meta:
+        constraints = [
+            # Also the index a feed page is read from, newest first
+            UniqueConstraint(fields=["owner", "activity"], name="unique_feed_entry")
+        ]
+
+    def __repr__(self):
+        return f"<FeedEntry owner_pk={self.owner_id} activity_pk={self.activity_id}>"
+
+
+class Task(models.Model):
+    """A queued call of an api.tasks task, for the database task backend."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "pending"
+        FAILED = "failed", "failed"
+
+    # Import path of the task function
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=7, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Due tasks in the order workers claim them
+            models.Index(
+                fields=["run_at", "id"],
+                condition=Q(status="pending"),
+                name="task_pending_run_at",
+            ),
+        ]
+
+    def __repr__(self):
+        return f"<Task pk={self.pk} name={self.name} status={self.status}>"
+
+
+class ThrottleBucket(models.Model):
+    """
+    A client's shared token bucket for api.throttling, holding the tokens
+    left as of updated_at.
+    """
+
+    # Throttle scope and client, e.g. "throttle_user_12"
+    key = models.CharField(max_length=64, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    def __repr__(self):
+        return f"<ThrottleBucket key={self.key} tokens={self.tokens}>"
+
+
+class CacheGeneration(models.Model):
+    """
+    The current generation token of an api.cache.ResponseCache scope, kept
+    in the database so every process sees an invalidation once it commits.
+    """
+
+    # e.g. "books" or "book:12"
+    scope = models.CharField(max_length=255, unique=True)
+    generation = models.UUIDField(default=uuid.uuid4)
+    # The Last-Modified of responses cached under the scope
+    invalidated_at = models.DateTimeField(default=timezone.now)
+
+    def __repr__(self):
+        return f"<CacheGeneration scope={self.scope} generation={self.generation}>"
@@ -0,0 +1,210 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import F, Func, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    _positive_int,
+    replace_query_param,
+)
+from rest_framework.response import Response
+
+
+class Row(Func):
+    """A row constructor, e.g. ROW(popularity, book_id), for tuple comparisons."""
+
+    function = "ROW"
+    output_field = models.Field()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages a queryset by a cursor holding every ordering value of the last
+    row, compared as one row value: WHERE (rank, id) < (0.6, 42). Unlike
+    DRF's CursorPagination, which keeps only the first ordering value and
+    steps over ties with an OFFSET, every page is a single index range
+    however many rows share a value. All ordering fields must sort in the
+    same direction and the last one must be unique.
+    """
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.MAX_PAGE_SIZE
+    cursor_query_param = "cursor"
+    ordering = ("-pk",)
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params.get(self.page_size_query_param, self.page_size),
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except ValueError:
+            return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+        descending = ordering[0].startswith("-")
+        # Carry the ordering values on every row, model instance or dict
+        self.keys = [f"cursor_{index}" for index in range(len(ordering))]
+        queryset = queryset.annotate(
+            **{key: F(field.lstrip("-")) for key, field in zip(self.keys, ordering)}
+        )
+
+        position, reverse = self.decode_cursor(request, queryset)
+        if position is not None:
+            lookup = "gt" if descending == reverse else "lt"
+            queryset = queryset.alias(
+                cursor_row=Row(*[F(key) for key in self.keys])
+            ).filter(**{f"cursor_row__{lookup}": Row(*position)})
+        queryset = queryset.order_by(
+            *[
+                F(key).desc() if descending != reverse else F(key).asc()
+                for key in self.keys
+            ]
+        )
+
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        self.page = rows[:page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values, reverse = cursor["p"], bool(cursor["r"])
+            if len(values) != len(self.keys):
+                raise ValueError
+            position = []
+            for key, value in zip(self.keys, values):
+                output_field = queryset.query.annotations[key].output_field
+                value = output_field.to_python(value)
+                position.append(Value(value, output_field=output_field))
+        except (TypeError, KeyError, ValueError, ValidationError):
+            raise NotFound("Invalid cursor")
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        values = []
+        for key in self.keys:
+            value = row[key] if isinstance(row, dict) else getattr(row, key)
+            # isoformat() keeps microseconds, which DjangoJSONEncoder drops
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        cursor = json.dumps({"p": values, "r": int(reverse)}, separators=(",", ":"))
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode("ascii"),
+        )
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class BookPagination(KeysetPagination):
+    ordering = ("title", "pk")
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get("search"):
+            return ("-rank", "-pk")
+        return super().get_ordering(request, queryset, view)
+
+
+class PopularBookPagination(KeysetPagination):
+    # Both values come from api_bookstats, so the row comparison is a range
+    # on the book_stats_popularity index
+    ordering = ("-stats__popularity", "-stats__book")
+
+
+class BookRecordPagination(KeysetPagination):
+    ordering = ("-created_at", "-pk")
+
+
+class BookReviewPagination(KeysetPagination):
+    ordering = ("-pk",)
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get("search"):
+            return ("-rank", "-pk")
+        return super().get_ordering(request, queryset, view)
+
+
+class FeedPagination(BasePagination):
+    """
+    Pages through an api.feed.Timeline, newest first. The cursor is the pk
+    of the last activity on the page, so a page is read straight off the
+    timeline indexes.
+    """
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.MAX_PAGE_SIZE
+    cursor_query_param = "before"
+
+    def paginate_queryset(self, timeline, request, view=None):
+        self.request = request
+        try:
+            page_size = _positive_int(
+                request.query_params.get(self.page_size_query_param, self.page_size),
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except ValueError:
+            page_size = self.page_size
+        try:
+            before = request.query_params.get(self.cursor_query_param)
+            before = None if before is None else _positive_int(before, strict=True)
+        except ValueError:
+            raise NotFound("Invalid cursor")
+
+        page = timeline.page(before, page_size + 1)
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.page[-1].pk
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
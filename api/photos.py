@@ -0,0 +1,114 @@
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import User
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for each variant; "large" also becomes User.photo
+VARIANT_SIZES = {"small": 64, "medium": 256, "large": 1024}
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+PHOTO_FIELD_VARIANT = ("large", "jpeg")
+
+_storage_pool = ThreadPoolExecutor(
+    max_workers=settings.PHOTO_STORAGE_WORKERS, thread_name_prefix="photo-storage"
+)
+
+
+def submit_photo(user, upload):
+    """
+    Keep the spooled upload in PHOTO_SPOOL_DIR, mark the user's photo as
+    pending and queue process_photo for it. Nothing is written to storage
+    during the request.
+    """
+    extension = os.path.splitext(upload.name)[1].lower()
+    path = os.path.join(
+        settings.PHOTO_SPOOL_DIR, f"{user.pk}-{uuid.uuid4().hex}-original{extension}"
+    )
+    # A rename within the spool directory, so the upload outlives the request
+    os.replace(upload.temporary_file_path(), path)
+    user.photo_status = User.PhotoStatus.PENDING
+    user.save(update_fields=["photo_status"])
+    process_photo.delay(user_pk=user.pk, path=path)
+
+
+def render_variants(file):
+    """
+    Decode the image once and encode every size/format combination.
+    """
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    variants = {}
+    for size_name, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=85)
+            variants[(size_name, extension)] = buffer.getvalue()
+    return variants
+
+
+def photo_failed(user_pk, path):
+    User.objects.filter(pk=user_pk).update(photo_status=User.PhotoStatus.FAILED)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@task(on_failure=photo_failed)
+def process_photo(user_pk, path):
+    """
+    Render the spooled original at `path`, store its variants and delete
+    it. Storage errors are raised so the task is retried; an original that
+    can't be decoded fails the photo straight away.
+    """
+    if not os.path.exists(path):
+        # Already processed by an earlier run of this task
+        return
+    try:
+        variants = render_variants(path)
+    except (OSError, Image.DecompressionBombError):
+        logger.exception("Decoding photo for user %s failed", user_pk)
+        photo_failed(user_pk, path)
+        return
+    prefix = f"{User.photo.field.upload_to}/{user_pk}/{uuid.uuid4().hex}"
+
+    def store(item):
+        (size_name, extension), content = item
+        variant_name = f"{prefix}-{size_name}.{extension}"
+        return (
+            size_name,
+            extension,
+            default_storage.save(variant_name, ContentFile(content)),
+        )
+
+    photo_variants = {}
+    for size_name, extension, variant_name in _storage_pool.map(
+        store, variants.items()
+    ):
+        photo_variants.setdefault(size_name, {})[extension] = variant_name
+
+    previous_variants = (
+        User.objects.filter(pk=user_pk).values_list("photo_variants", flat=True).first()
+        or {}
+    )
+    size_name, extension = PHOTO_FIELD_VARIANT
+    User.objects.filter(pk=user_pk).update(
+        photo=photo_variants[size_name][extension],
+        photo_variants=photo_variants,
+        photo_status=User.PhotoStatus.READY,
+    )
+    for formats in previous_variants.values():
+        for variant_name in formats.values():
+            default_storage.delete(variant_name)
+    os.remove(path)
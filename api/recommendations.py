@@ -0,0 +1,169 @@
+import heapq
+import math
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Subquery, Sum
+
+from .models import Book, BookRecord, SimilarBook
+from .tasks import task
+
+# Only readers who read or are reading a book count towards its similarity
+READER_STATES = (BookRecord.ReadingState.READ, BookRecord.ReadingState.READING)
+
+# Recommendations are drawn from the neighbours of this many of the reader's
+# most recently updated books
+RECOMMENDATION_SEED_BOOKS = 50
+
+# Deletes all but the top SIMILAR_BOOKS_TOP_K rows of each listed book
+TRIM_SQL = """
+    DELETE FROM api_similarbook WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY book_id ORDER BY score DESC, similar_id
+            ) AS position
+            FROM api_similarbook
+            WHERE book_id = ANY(%s)
+        ) AS ranked
+        WHERE position > %s
+    )
+"""
+
+
+def similar_books(book_id):
+    return (
+        Book.objects.filter(similar_to__book_id=book_id)
+        .only("title", "author", "featured")
+        .annotate(score=F("similar_to__score"))
+        .order_by("-score", "pk")
+    )
+
+
+def recommended_books(user):
+    """
+    Books most similar to the ones `user` has read or is reading, scored by
+    the sum of their similarities, leaving out books the user has a record
+    of. Only reads the precomputed neighbour lists.
+    """
+    seed_book_ids = (
+        BookRecord.objects.filter(reader=user, reading_state__in=READER_STATES)
+        .order_by("-updated_at")
+        .values("book_id")[:RECOMMENDATION_SEED_BOOKS]
+    )
+    return (
+        Book.objects.filter(similar_to__book_id__in=Subquery(seed_book_ids))
+        .exclude(book_records__reader=user)
+        .only("title", "author", "featured")
+        .annotate(score=Sum("similar_to__score"))
+        .order_by("-score", "pk")
+    )
+
+
+def cosine(co_readers, readers, other_readers):
+    return co_readers / math.sqrt(readers * other_readers)
+
+
+def refresh(book_id):
+    """
+    Recompute a book's neighbours after its readers changed, and its score
+    in the neighbour lists of the books it shares readers with.
+
+    The book's own list is exact. A neighbour's list only gains, loses or
+    rescores this book, so other changes to it wait for the next
+    build_similar_books run.
+    """
+    top_k = settings.SIMILAR_BOOKS_TOP_K
+    readers = BookRecord.objects.filter(
+        book_id=book_id, reading_state__in=READER_STATES
+    ).values("reader_id")
+    co_readers = dict(
+        BookRecord.objects.filter(
+            reader_id__in=Subquery(readers), reading_state__in=READER_STATES
+        )
+        .order_by()
+        .values_list("book_id")
+        .annotate(count=Count("reader_id", distinct=True))
+    )
+    book_readers = co_readers.pop(book_id, 0)
+    co_readers = {
+        other_id: count
+        for other_id, count in co_readers.items()
+        if count >= settings.SIMILAR_BOOKS_MIN_CO_READERS
+    }
+    other_readers = dict(
+        BookRecord.objects.filter(
+            book_id__in=co_readers, reading_state__in=READER_STATES
+        )
+        .order_by()
+        .values_list("book_id")
+        .annotate(count=Count("reader_id", distinct=True))
+    )
+    scores = {
+        other_id: cosine(count, book_readers, other_readers[other_id])
+        for other_id, count in co_readers.items()
+        if other_readers.get(other_id)
+    }
+
+    # Neighbours whose list holds this book already, has room for it, or
+    # scores it above its current last entry
+    listed = set(
+        SimilarBook.objects.filter(similar_id=book_id).values_list("book_id", flat=True)
+    )
+    lists = {
+        other_id: (size, lowest)
+        for other_id, size, lowest in SimilarBook.objects.filter(book_id__in=scores)
+        .order_by()
+        .values_list("book_id")
+        .annotate(size=Count("pk"), lowest=Min("score"))
+    }
+    updates = {
+        other_id: score
+        for other_id, score in scores.items()
+        if other_id in listed
+        or lists.get(other_id, (0, 0))[0] < top_k
+        or score > lists[other_id][1]
+    }
+
+    with transaction.atomic():
+        SimilarBook.objects.filter(book_id=book_id).delete()
+        SimilarBook.objects.filter(similar_id=book_id).delete()
+        SimilarBook.objects.bulk_create(
+            [
+                SimilarBook(book_id=book_id, similar_id=other_id, score=score)
+                for other_id, score in heapq.nlargest(
+                    top_k, scores.items(), key=lambda item: item[1]
+                )
+            ]
+            + [
+                SimilarBook(book_id=other_id, similar_id=book_id, score=score)
+                for other_id, score in updates.items()
+            ],
+            batch_size=settings.BULK_BATCH_SIZE,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(TRIM_SQL, [list(updates), top_k])
+
+
+@task(batch_size=50)
+def refresh_similar_books(payloads):
+    book_ids = {book_id for payload in payloads for book_id in payload["book_ids"]}
+    for book_id in sorted(book_ids):
+        refresh(book_id)
+
+
+def queue_refresh(changes):
+    """
+    Queue refreshing the books that gained or lost a reader, given a
+    ((book_id, reading_state) before, (book_id, reading_state) after) pair
+    for each changed record.
+    """
+    book_ids = set()
+    for before, after in changes:
+        counted = [
+            book_id if state in READER_STATES else None
+            for book_id, state in (before, after)
+        ]
+        if counted[0] != counted[1]:
+            book_ids.update(book_id for book_id in counted if book_id is not None)
+    if book_ids:
+        refresh_similar_books.delay(book_ids=sorted(book_ids))
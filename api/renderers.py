@@ -0,0 +1,146 @@
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONFragment(bytes):
+    """Already encoded JSON that FastJSONRenderer splices into its output."""
+
+
+class _FragmentFound(Exception):
+    pass
+
+
+def _escape_line_separators(encoded):
+    # Match JSONRenderer, which escapes these so the output is valid JavaScript
+    return encoded.replace("\u2028".encode(), b"\\u2028").replace(
+        "\u2029".encode(), b"\\u2029"
+    )
+
+
+class _Encoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, JSONFragment):
+            raise _FragmentFound
+        return super().default(obj)
+
+
+_python_encoder = _Encoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def _orjson_default(obj):
+    if isinstance(obj, JSONFragment):
+        return orjson.Fragment(bytes(obj))
+    return _python_encoder.default(obj)
+
+
+def _python_encode(data):
+    try:
+        return _python_encoder.encode(data).encode()
+    except _FragmentFound:
+        pass
+    # Only containers holding fragments are walked; everything else is
+    # left to the C encoder.
+    if isinstance(data, JSONFragment):
+        return bytes(data)
+    if isinstance(data, dict):
+        return (
+            b"{"
+            + b",".join(
+                _python_encoder.encode(str(key)).encode() + b":" + _python_encode(value)
+                for key, value in data.items()
+            )
+            + b"}"
+        )
+    if isinstance(data, (list, tuple)):
+        return b"[" + b",".join(_python_encode(item) for item in data) + b"]"
+    return _python_encoder.encode(data).encode()
+
+
+def encode_json(data):
+    """
+    Encode data as compact JSON, the same bytes JSONRenderer produces with
+    the default settings. Uses orjson when it is installed.
+    """
+    if orjson is not None:
+        encoded = orjson.dumps(
+            data,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    else:
+        encoded = _python_encode(data)
+    return _escape_line_separators(encoded)
+
+
+def expand_fragments(data):
+    if isinstance(data, JSONFragment):
+        return json.loads(data)
+    if isinstance(data, dict):
+        return type(data)((key, expand_fragments(value)) for key, value in data.items())
+    if isinstance(data, list):
+        return [expand_fragments(item) for item in data]
+    return data
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes compact responses with encode_json() and
+    accepts JSONFragments in the data. Indented output (the browsable API,
+    ?indent=) and non-default JSON settings go through JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is None and self.compact and not self.ensure_ascii:
+            return encode_json(data)
+        return super().render(
+            expand_fragments(data), accepted_media_type, renderer_context
+        )
+
+
+class FragmentCache:
+    """
+    In-process LRU of encoded representations. Keys include the row's
+    updated_at, so a saved row gets a new entry and the old one ages out.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get_or_encode(self, key, build):
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+        fragment = JSONFragment(encode_json(build()))
+        with self._lock:
+            self._fragments[key] = fragment
+            if len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+
+fragment_cache = FragmentCache(settings.JSON_FRAGMENT_CACHE_MAX_ENTRIES)
@@ -1,5 +1,24 @@
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Book, BookRecord, BookReview, User
+from .instrumentation import InstrumentedSerializerMixin
+from .models import Activity, Book, BookRecord, BookReview, BookStats, User
+
+
+class EagerLoadingMixin:
+    # Relations the serializer reads, applied to the view's queryset by
+    # EagerLoadingViewMixin so a list costs a fixed number of queries.
+
+    select_related = ()
+    prefetch_related = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related:
+            queryset = queryset.select_related(*cls.select_related)
+        if cls.prefetch_related:
+            queryset = queryset.prefetch_related(*cls.prefetch_related)
+        return queryset
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -8,43 +27,150 @@ class UserCreateSerializer(serializers.ModelSerializer):
         fields = ("username", "email", "password")
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(
+    InstrumentedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
+    # Lets api/fastpath.py reuse this representation until the book changes
+    fragment_key = ("pk", "updated_at")
+
     class Meta:
         model = Book
         fields = ("pk", "title", "author", "featured")
 
 
-class BookDetailSerializer(serializers.ModelSerializer):
+class BookStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookStats
+        fields = (
+            "want_to_read_count",
+            "reading_count",
+            "read_count",
+            "review_count",
+            "popularity",
+        )
+
+
+class PopularBookSerializer(BookSerializer):
+    stats = BookStatsSerializer()
+
+    select_related = ("stats",)
+
+    class Meta(BookSerializer.Meta):
+        fields = (*BookSerializer.Meta.fields, "stats")
+
+
+class ScoredBookSerializer(BookSerializer):
+    # Similarity to the requested book, or summed over the reader's books
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = (*BookSerializer.Meta.fields, "score")
+
+
+class BookDetailSerializer(
+    InstrumentedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
     reviews = serializers.HyperlinkedRelatedField(
         many=True, read_only=True, view_name="book_reviews-detail"
     )
 
+    prefetch_related = (
+        Prefetch("reviews", queryset=BookReview.objects.only("pk", "book_id")),
+    )
+
     class Meta:
         model = Book
         fields = ("pk", "title", "author", "publication_year", "featured", "reviews")
 
 
-class BookRecordSerializer(serializers.ModelSerializer):
+class BookRecordSerializer(
+    InstrumentedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
     book = BookSerializer()
     reader = serializers.SlugRelatedField(read_only=True, slug_field="username")
 
+    select_related = ("book", "reader")
+
     class Meta:
         model = BookRecord
         fields = ("pk", "book", "reader", "reading_state")
 
 
-class BookReviewSerializer(serializers.ModelSerializer):
+class BookRecordBulkItemSerializer(serializers.Serializer):
+    pk = serializers.IntegerField(required=False)
+    book = serializers.IntegerField(required=False)
+    reading_state = serializers.ChoiceField(
+        choices=BookRecord.ReadingState.choices, allow_null=True, required=False
+    )
+
+    def validate(self, data):
+        if "pk" not in data and "book" not in data:
+            raise serializers.ValidationError(
+                {"book": "This field is required when creating a record."}
+            )
+        return data
+
+
+class BookReviewSerializer(
+    InstrumentedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
     book = serializers.SlugRelatedField(read_only=True, slug_field="title")
     reviewed_by = serializers.SlugRelatedField(read_only=True, slug_field="username")
+    # Only present on ?search= results, with the matching words in <b> tags
+    headline = serializers.CharField(read_only=True)
+
+    select_related = ("book", "reviewed_by")
 
     class Meta:
         model = BookReview
-        fields = ("pk", "body", "book", "reviewed_by")
+        fields = ("pk", "body", "book", "reviewed_by", "headline")
 
 
-class UserSerializer(serializers.ModelSerializer):
+class ActivityReviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookReview
+        fields = ("pk", "body")
+
+
+class ActivitySerializer(
+    InstrumentedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
+    actor = serializers.SlugRelatedField(read_only=True, slug_field="username")
+    book = BookSerializer()
+    review = ActivityReviewSerializer()
+
+    select_related = ("actor", "book", "review")
+
+    class Meta:
+        model = Activity
+        fields = (
+            "pk",
+            "actor",
+            "verb",
+            "book",
+            "reading_state",
+            "review",
+            "created_at",
+        )
+
+
+class UserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     photo = serializers.ImageField()
+    photo_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ["pk", "username", "photo"]
+        fields = ["pk", "username", "photo", "photo_status", "photo_variants"]
+        read_only_fields = ["photo_status"]
+
+    def get_photo_variants(self, user):
+        request = self.context.get("request")
+        variants = {}
+        for size_name, formats in user.photo_variants.items():
+            variants[size_name] = {}
+            for extension, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[size_name][extension] = url
+        return variants
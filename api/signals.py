@@ -0,0 +1,127 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import get_token_cache, token_cache_key
+from .cache import book_response_cache
+from .models import Book, BookRecord, BookReview, BookStats, Follow, User
+from .recommendations import queue_refresh
+from .tasks import task
+
+
+@receiver(post_save, sender=Book)
+def update_book_search_document(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"title", "author"} & set(update_fields):
+        return
+    Book.objects.filter(pk=instance.pk).update_search_document()
+
+
+@receiver(post_save, sender=BookReview)
+def update_review_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "body" not in update_fields:
+        return
+    BookReview.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=BookReview)
+@receiver(post_delete, sender=BookReview)
+def update_reviewed_book_search_document(sender, instance, **kwargs):
+    # Aggregates every review of the book, so it is left to a task
+    update_search_documents.delay(book_ids=[instance.book_id])
+
+
+@task(batch_size=100)
+def update_search_documents(payloads):
+    book_ids = {book_id for payload in payloads for book_id in payload["book_ids"]}
+    Book.objects.filter(pk__in=book_ids).update_search_document()
+    # Searches run while the task was queued cached the old documents
+    book_response_cache.invalidate("reviews")
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_responses(sender, instance, **kwargs):
+    book_response_cache.invalidate("books", "reviews", f"book:{instance.pk}")
+
+
+@receiver(post_save, sender=BookReview)
+@receiver(post_delete, sender=BookReview)
+def invalidate_reviewed_book_responses(sender, instance, **kwargs):
+    book_response_cache.invalidate("reviews", f"book:{instance.book_id}")
+
+
+@receiver(post_save, sender=Book)
+def create_book_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        BookStats.objects.create(book=instance)
+
+
+@receiver(post_init, sender=BookRecord)
+def remember_book_record_state(sender, instance, **kwargs):
+    instance._counted_state = (instance.book_id, instance.reading_state)
+
+
+# Connected before update_book_record_stats, which resets _counted_state
+@receiver(post_save, sender=BookRecord)
+@receiver(post_delete, sender=BookRecord)
+def refresh_similar_books_of_record(sender, instance, signal, created=False, **kwargs):
+    before = (None, None) if created else instance._counted_state
+    after = (
+        (instance.book_id, instance.reading_state)
+        if signal is post_save
+        else (None, None)
+    )
+    queue_refresh([(before, after)])
+
+
+@receiver(post_save, sender=BookRecord)
+@receiver(post_delete, sender=BookRecord)
+def update_book_record_stats(sender, instance, signal, created=False, **kwargs):
+    deltas = defaultdict(Counter)
+    counted_book_id, counted_state = instance._counted_state
+    if not created and counted_state in BookStats.STATE_FIELDS:
+        deltas[counted_book_id][BookStats.STATE_FIELDS[counted_state]] -= 1
+    if signal is post_save and instance.reading_state in BookStats.STATE_FIELDS:
+        deltas[instance.book_id][BookStats.STATE_FIELDS[instance.reading_state]] += 1
+    for book_id, book_deltas in deltas.items():
+        BookStats.objects.apply_delta(book_id, **book_deltas)
+    instance._counted_state = (instance.book_id, instance.reading_state)
+
+
+@receiver(post_save, sender=BookReview)
+@receiver(post_delete, sender=BookReview)
+def update_book_review_stats(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete:
+        BookStats.objects.apply_delta(instance.book_id, review_count=-1)
+    elif created:
+        BookStats.objects.apply_delta(instance.book_id, review_count=1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def update_follower_count(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete:
+        delta = -1
+    elif created:
+        delta = 1
+    else:
+        return
+    User.objects.filter(pk=instance.followed_id).update(
+        follower_count=F("follower_count") + delta
+    )
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    get_token_cache().delete(token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def forget_saved_users_token(sender, instance, raw=False, **kwargs):
+    # Covers deactivation and permission changes on cached users
+    if raw:
+        return
+    keys = Token.objects.filter(user=instance).values_list("key", flat=True)
+    get_token_cache().delete_many([token_cache_key(key) for key in keys])
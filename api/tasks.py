@@ -0,0 +1,224 @@
+"""
+Background tasks for work that doesn't need to finish inside the request.
+
+    @task(batch_size=100)
+    def fan_out_activities(payloads):
+        ...
+
+    fan_out_activities.delay(activity_ids=[1, 2])
+
+Payloads are the keyword arguments given to delay() and must be JSON
+serializable. A task with batch_size 1 is called with them as keyword
+arguments; a batched task is called with a list of up to batch_size payloads
+of queued calls. Failed calls are retried up to max_retries times, waiting
+retry_delay seconds and doubling the wait after each attempt, and are then
+passed to the task's on_failure function, if any, the same way. Tasks can
+run more than once, so they should be idempotent.
+
+TASK_BACKEND picks where tasks run: LocalBackend runs them on a thread pool
+in the web process once the current transaction commits, and
+DatabaseBackend queues them in the api_task table for `manage.py
+run_worker`, in the same transaction as the work that queued them.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache, update_wrapper
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTask:
+    def __init__(self, func, batch_size, max_retries, retry_delay, on_failure):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_failure = on_failure
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, **payload):
+        get_backend().enqueue(self, payload)
+
+    def run(self, payloads):
+        # A failed attempt leaves nothing behind for the retry to trip over
+        with transaction.atomic():
+            if self.batch_size > 1:
+                self.func(payloads)
+            else:
+                for payload in payloads:
+                    self.func(**payload)
+
+    def give_up(self, payloads):
+        """Hand calls that ran out of retries to on_failure."""
+        if self.on_failure is None:
+            return
+        with transaction.atomic():
+            if self.batch_size > 1:
+                self.on_failure(payloads)
+            else:
+                for payload in payloads:
+                    self.on_failure(**payload)
+
+    def retry_after(self, attempts):
+        """Seconds to wait before retrying after `attempts` failed attempts."""
+        return self.retry_delay * 2 ** (attempts - 1)
+
+
+def task(batch_size=1, max_retries=3, retry_delay=10, on_failure=None):
+    def decorator(func):
+        return BackgroundTask(func, batch_size, max_retries, retry_delay, on_failure)
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.TASK_BACKEND)()
+
+
+class LocalBackend:
+    """
+    Runs tasks on a thread pool in this process. Calls of a batched task
+    queued while one of its batches waits for a thread join that batch.
+    Queued tasks are lost if the process exits.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(
+            max_workers=settings.TASK_WORKERS, thread_name_prefix="task"
+        )
+        self._pending = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def enqueue(self, task, payload):
+        transaction.on_commit(lambda: self._submit(task, [(payload, 0)]))
+
+    def _submit(self, task, calls):
+        if task.batch_size == 1:
+            for call in calls:
+                self._pool.submit(self._run, task, [call])
+            return
+        with self._lock:
+            pending = self._pending[task.name]
+            pending.extend(calls)
+            # Otherwise a flush is already waiting and will take these too
+            if len(pending) > len(calls):
+                return
+        self._pool.submit(self._flush, task)
+
+    def _flush(self, task):
+        with self._lock:
+            pending = self._pending[task.name]
+            calls = pending[: task.batch_size]
+            del pending[: task.batch_size]
+            if pending:
+                self._pool.submit(self._flush, task)
+        self._run(task, calls)
+
+    def _run(self, task, calls):
+        try:
+            task.run([payload for payload, _ in calls])
+        except Exception:
+            attempts = calls[0][1] + 1
+            if attempts > task.max_retries:
+                logger.exception("Task %s failed, giving up", task.name)
+                task.give_up([payload for payload, _ in calls])
+                return
+            logger.exception("Task %s failed, retrying", task.name)
+            retry = [(payload, attempts) for payload, _ in calls]
+            timer = threading.Timer(
+                task.retry_after(attempts), self._submit, (task, retry)
+            )
+            timer.daemon = True
+            timer.start()
+        finally:
+            connection.close()
+
+
+class DatabaseBackend:
+    """
+    Queues tasks as api_task rows. Workers claim due rows with SELECT ...
+    FOR UPDATE SKIP LOCKED and keep them locked while the task runs, so
+    concurrent workers never run the same call, and a crashed worker's
+    rows are picked up again once its transaction is rolled back.
+    """
+
+    def enqueue(self, task, payload):
+        Task.objects.create(name=task.name, payload=payload)
+
+    def run_next(self):
+        """
+        Claim and run the next batch of due tasks of one kind. Returns the
+        number of calls run, 0 if nothing was due.
+        """
+        now = timezone.now()
+        due = (
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.Status.PENDING, run_at__lte=now)
+            .order_by("run_at", "id")
+        )
+        with transaction.atomic():
+            first = due.first()
+            if first is None:
+                return 0
+            try:
+                task = import_string(first.name)
+            except ImportError:
+                logger.error("Unknown task %s", first.name)
+                self.fail([first], f"Unknown task {first.name}")
+                return 1
+            claimed = [first]
+            if task.batch_size > 1:
+                claimed += due.filter(name=first.name).exclude(pk=first.pk)[
+                    : task.batch_size - 1
+                ]
+
+            try:
+                task.run([claimed_task.payload for claimed_task in claimed])
+            except Exception as e:
+                logger.exception("Task %s failed", task.name)
+                self.retry(task, claimed, now, repr(e))
+            else:
+                Task.objects.filter(
+                    pk__in=[claimed_task.pk for claimed_task in claimed]
+                ).delete()
+            return len(claimed)
+
+    def retry(self, task, claimed, now, error):
+        failed = []
+        for claimed_task in claimed:
+            claimed_task.attempts += 1
+            claimed_task.last_error = error
+            if claimed_task.attempts > task.max_retries:
+                claimed_task.status = Task.Status.FAILED
+                failed.append(claimed_task.payload)
+            else:
+                claimed_task.run_at = now + timedelta(
+                    seconds=task.retry_after(claimed_task.attempts)
+                )
+        Task.objects.bulk_update(
+            claimed, ["attempts", "last_error", "status", "run_at"]
+        )
+        if failed:
+            task.give_up(failed)
+
+    def fail(self, claimed, error):
+        for claimed_task in claimed:
+            claimed_task.status = Task.Status.FAILED
+            claimed_task.last_error = error
+        Task.objects.bulk_update(claimed, ["status", "last_error"])
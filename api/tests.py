@@ -0,0 +1,575 @@
+import asyncio
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from .authentication import get_token_cache
+from .benchmarks import unthrottled
+from .cache import book_response_cache
+from .fastpath import ValuesListMixin
+from .instrumentation import RequestInstrumentationMiddleware, endpoint_stats
+from .models import (
+    Book,
+    BookRecord,
+    BookReview,
+    BookStats,
+    CacheGeneration,
+    Task,
+    User,
+)
+from .photos import process_photo
+from .renderers import fragment_cache
+from .tasks import DatabaseBackend
+from .throttling import (
+    AnonCostRateThrottle,
+    UserCostRateThrottle,
+    get_throttle_cache,
+)
+
+
+@unthrottled()
+class ListQueryCountTests(TestCase):
+    """
+    A list page costs the same number of queries however many rows it
+    holds, on the values() fast path and through the serializers.
+    """
+
+    def setUp(self):
+        book_response_cache.cache.clear()
+        self.reader = User.objects.create_user("reader", password="password")
+        self.other = User.objects.create_user("other", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.book = Book.objects.create(title="Reviewed", author="Author")
+
+    def add_rows(self, count):
+        start = Book.objects.count()
+        for n in range(start, start + count):
+            book = Book.objects.create(
+                title=f"Book {n}", author=f"Author {n}", featured=True
+            )
+            BookRecord.objects.create(book=book, reader=self.reader, reading_state="rd")
+            BookReview.objects.create(
+                body=f"Review {n}", book=self.book, reviewed_by=self.other
+            )
+            BookReview.objects.create(body=f"Review {n}", book=book, reviewed_by=None)
+
+    def assertConstantQueries(self, url, num):
+        for values_list_enabled in (True, False):
+            with self.subTest(values_list=values_list_enabled), mock.patch.object(
+                ValuesListMixin, "values_list_enabled", values_list_enabled
+            ):
+                for rows in (2, 20):
+                    self.add_rows(rows)
+                    with self.assertNumQueries(num):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_books(self):
+        # Cache generations, which the ETag uses too, and the page
+        self.assertConstantQueries("/api/books", 2)
+
+    def test_featured_books(self):
+        # Cache generations, the page and its review links
+        self.assertConstantQueries("/api/books/featured", 3)
+
+    def test_book_records(self):
+        # ETag aggregate and the page joined to its books and reader
+        self.assertConstantQueries("/api/book_records", 2)
+
+    def test_book_reviews(self):
+        # The page joined to its book and reviewer
+        self.assertConstantQueries(f"/api/books/{self.book.pk}/reviews", 1)
+
+    def test_review_search(self):
+        self.assertConstantQueries("/api/reviews?search=review", 1)
+
+
+@unthrottled()
+class ValuesListSerializationTests(TestCase):
+    """
+    The values() fast path renders the same bytes as the serializers.
+    """
+
+    def setUp(self):
+        self.reader = User.objects.create_user("reader", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        reviewed = Book.objects.create(
+            title="Reviewed", author="Author", publication_year=1999, featured=True
+        )
+        # No publication year, no reviews and a character JSONRenderer escapes
+        unreviewed = Book.objects.create(
+            title="Unreviewed \u2028 é", author="Author", featured=True
+        )
+        BookReview.objects.create(body="Kept", book=reviewed, reviewed_by=self.reader)
+        BookReview.objects.create(body="Orphaned", book=reviewed, reviewed_by=None)
+        BookRecord.objects.create(book=reviewed, reader=self.reader, reading_state="rd")
+        BookRecord.objects.create(
+            book=unreviewed, reader=self.reader, reading_state=None
+        )
+
+    def render(self, url, values_list_enabled, fragments=0):
+        book_response_cache.cache.clear()
+        with mock.patch.object(
+            ValuesListMixin, "values_list_enabled", values_list_enabled
+        ), mock.patch.object(fragment_cache, "max_entries", fragments):
+            fragment_cache.clear()
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assertSameBytes(self, url):
+        expected = self.render(url, values_list_enabled=False)
+        self.assertEqual(self.render(url, values_list_enabled=True), expected)
+        self.assertEqual(
+            self.render(url, values_list_enabled=True, fragments=100), expected
+        )
+        return expected
+
+    def test_books(self):
+        content = self.assertSameBytes("/api/books")
+        self.assertIn(b'"featured":true', content)
+
+    def test_books_page_links(self):
+        self.assertSameBytes("/api/books?page_size=1")
+
+    def test_featured_books(self):
+        content = self.assertSameBytes("/api/books/featured")
+        self.assertIn(b"http://testserver/api/book_reviews/", content)
+        self.assertIn(b'"reviews":[]', content)
+
+    def test_book_records(self):
+        content = self.assertSameBytes("/api/book_records")
+        self.assertIn(b'"reading_state":null', content)
+
+
+@unthrottled()
+class KeysetPaginationTests(TestCase):
+    """
+    Cursors carry every ordering value, so a walk through more rows with the
+    same first value than an OFFSET could skip still visits each row once.
+    """
+
+    def setUp(self):
+        book_response_cache.cache.clear()
+        self.reader = User.objects.create_user("reader", password="password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def walk(self, url, count):
+        pks, url = [], f"{url}page_size=100"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pks.extend(result["pk"] for result in response.data["results"])
+            url, previous = response.data["next"], response.data["previous"]
+            self.assertLess(len(pks), count + 100, "the walk doesn't end")
+        self.assertEqual(sorted(pks), sorted(set(pks)))
+        self.assertEqual(len(pks), count)
+
+        # And back again from the last page
+        back = [result["pk"] for result in response.data["results"]]
+        while previous:
+            response = self.client.get(previous)
+            self.assertEqual(response.status_code, 200)
+            back[:0] = [result["pk"] for result in response.data["results"]]
+            previous = response.data["previous"]
+        self.assertEqual(back, pks)
+        return pks
+
+    def test_popular_books_with_tied_popularity(self):
+        books = Book.objects.bulk_create(
+            Book(title=f"Book {n}", author="Author") for n in range(1300)
+        )
+        BookStats.objects.bulk_create(
+            BookStats(book=book, popularity=1) for book in books
+        )
+        self.walk("/api/books/popular?", 1300)
+
+    def test_book_search_with_tied_rank(self):
+        Book.objects.bulk_create(
+            Book(title=f"Orchard {n}", author=f"Author {n}") for n in range(1100)
+        )
+        Book.objects.update_search_document()
+        self.walk("/api/books?search=orchard&", 1100)
+
+    def test_review_search_with_tied_rank(self):
+        book = Book.objects.create(title="Reviewed", author="Author")
+        BookReview.objects.bulk_create(
+            BookReview(body=f"Orchard {n}", book=book) for n in range(1100)
+        )
+        BookReview.objects.update_search_vector()
+        self.walk("/api/reviews?search=orchard&", 1100)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/books?cursor=e30")
+        self.assertEqual(response.status_code, 404)
+
+
+@unthrottled()
+class BookReviewPermissionTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author", password="password")
+        self.other = User.objects.create_user("other", password="password")
+        book = Book.objects.create(title="Reviewed", author="Author")
+        self.review = BookReview.objects.create(
+            body="Very good.", book=book, reviewed_by=self.author
+        )
+        self.url = f"/api/book_reviews/{self.review.pk}"
+        self.client = APIClient()
+
+    def test_anyone_can_read(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["reviewed_by"], "author")
+
+    def test_non_author_cannot_change(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(self.url, {"body": "Bad."}, format="json")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 403)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.body, "Very good.")
+
+    def test_author_can_change(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(self.url, {"body": "Good."}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["body"], "Good.")
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(BookReview.objects.filter(pk=self.review.pk).exists())
+
+
+@unthrottled()
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        book_response_cache.cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("reader"))
+        self.book = Book.objects.create(title="Cached", author="Author")
+
+    def test_serves_cached_response_until_invalidated(self):
+        self.client.get("/api/books")
+        Book.objects.filter(pk=self.book.pk).update(title="Changed quietly")
+        self.assertContains(self.client.get("/api/books"), "Cached")
+
+        # As a task worker process would after changing books
+        book_response_cache.invalidate("books")
+        self.assertContains(self.client.get("/api/books"), "Changed quietly")
+
+    def test_reads_of_missing_books_write_nothing(self):
+        generations = CacheGeneration.objects.count()
+        for pk in ("0", "9" * 300):
+            with self.subTest(pk=pk[:10]):
+                response = self.client.get(f"/api/books/{pk}")
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(CacheGeneration.objects.count(), generations)
+
+
+@unthrottled()
+class DatabaseTaskBackendTests(TestCase):
+    def setUp(self):
+        book_response_cache.cache.clear()
+        self.reader = User.objects.create_user("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.book = Book.objects.create(title="Garden", author="Author")
+        self.backend = DatabaseBackend()
+
+    def test_worker_invalidates_cached_search(self):
+        url = "/api/books?search=orchard"
+        with mock.patch("api.tasks.get_backend", return_value=self.backend):
+            BookReview.objects.create(
+                body="An orchard.", book=self.book, reviewed_by=self.reader
+            )
+        # The search document is rebuilt by the task, not by the request
+        self.assertEqual(self.client.get(url).data["results"], [])
+
+        self.assertEqual(self.backend.run_next(), 1)
+        results = self.client.get(url).data["results"]
+        self.assertEqual([book["pk"] for book in results], [self.book.pk])
+
+
+@unthrottled()
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        book_response_cache.cache.clear()
+        self.reader = User.objects.create_user("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.books = [
+            Book.objects.create(title=f"Book {n}", author="Author") for n in range(2)
+        ]
+        self.record = BookRecord.objects.create(
+            book=self.books[0], reader=self.reader, reading_state="rd"
+        )
+
+    def test_not_modified(self):
+        for url in (
+            "/api/books",
+            f"/api/books/{self.books[0].pk}",
+            "/api/book_records",
+        ):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+
+    def test_etag_varies_by_renderer(self):
+        json_response = self.client.get("/api/books", HTTP_ACCEPT="application/json")
+        html_response = self.client.get("/api/books", HTTP_ACCEPT="text/html")
+        self.assertNotEqual(json_response["ETag"], html_response["ETag"])
+        self.assertIn("Accept", json_response["Vary"])
+        response = self.client.get(
+            "/api/books",
+            HTTP_ACCEPT="text/html",
+            HTTP_IF_NONE_MATCH=json_response["ETag"],
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_on_delete(self):
+        for url, delete in (
+            ("/api/books", self.books[1].delete),
+            ("/api/book_records", self.record.delete),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                delete()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_matches_cached_body(self):
+        # Changed without signals, so the cache keeps serving the old title
+        etag = self.client.get("/api/books")["ETag"]
+        Book.objects.filter(pk=self.books[0].pk).update(title="Changed quietly")
+        response = self.client.get("/api/books", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        book_response_cache.invalidate("books")
+        response = self.client.get("/api/books", HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Changed quietly")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_books_last_modified(self):
+        for url in ("/api/books", f"/api/books/{self.books[0].pk}"):
+            with self.subTest(url=url):
+                last_modified = self.client.get(url)["Last-Modified"]
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+                self.assertEqual(response.status_code, 304)
+
+        # Rows deleted from a list move its Last-Modified on too
+        CacheGeneration.objects.update(
+            invalidated_at=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        last_modified = self.client.get("/api/books")["Last-Modified"]
+        self.books[1].delete()
+        response = self.client.get("/api/books", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_record_detail_last_modified(self):
+        response = self.client.get(f"/api/book_records/{self.record.pk}")
+        self.assertIn("Last-Modified", response)
+
+
+@unthrottled()
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        self.token = Token.objects.create(user=User.objects.create_user("reader"))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.client.get("/api/books").status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.client.get("/api/books").status_code, 401)
+
+    def test_inactive_user_is_rejected(self):
+        self.assertEqual(self.client.get("/api/books").status_code, 200)
+        self.token.user.is_active = False
+        self.token.user.save()
+        self.assertEqual(self.client.get("/api/books").status_code, 401)
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"anon": "1/min", "user": "1/min"},
+        "NUM_PROXIES": 1,
+    }
+)
+class ThrottleTests(TestCase):
+    """
+    Behind a proxy, clients are told apart by the address it appends to
+    X-Forwarded-For.
+    """
+
+    def setUp(self):
+        get_throttle_cache().clear()
+        self.book = Book.objects.create(title="Book", author="Author")
+        self.token = Token.objects.create(user=User.objects.create_user("reader"))
+        self.client = APIClient()
+
+    def get(self, address, token=None):
+        # The proxy appends the client's address to whatever the client sent
+        request = APIRequestFactory().get(
+            "/api/books", HTTP_X_FORWARDED_FOR=f"198.51.100.1, {address}"
+        )
+        if token is not None:
+            force_authenticate(request, token.user, token)
+        return Request(request)
+
+    def test_anonymous_clients_by_address(self):
+        throttle = AnonCostRateThrottle()
+        self.assertNotEqual(
+            throttle.get_cache_key(self.get("203.0.113.1"), None),
+            throttle.get_cache_key(self.get("203.0.113.2"), None),
+        )
+
+    def test_users_by_token_and_address(self):
+        other = Token.objects.create(user=User.objects.create_user("other"))
+        throttle = UserCostRateThrottle()
+        keys = {
+            throttle.get_cache_key(self.get(address, token), None)
+            for address in ("203.0.113.1", "203.0.113.2")
+            for token in (self.token, other)
+        }
+        self.assertEqual(len(keys), 4)
+
+    def test_throttled_per_address(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        url = f"/api/books/{self.book.pk}"
+        for address, status in (
+            ("203.0.113.1", 200),
+            ("203.0.113.1", 429),
+            ("203.0.113.2", 200),
+        ):
+            response = self.client.get(url, HTTP_X_FORWARDED_FOR=address)
+            self.assertEqual(response.status_code, status)
+
+
+@unthrottled()
+@override_settings(REQUEST_INSTRUMENTATION=True)
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        endpoint_stats.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("reader"))
+        Book.objects.create(title="Book", author="Author")
+
+    def test_streamed_bytes(self):
+        response = self.client.get("/api/books/export?format=csv")
+        self.assertIn("Server-Timing", response)
+        content = b"".join(response.streaming_content)
+        stats = endpoint_stats.as_dict()["GET books-export"]
+        self.assertEqual(stats["mean"]["bytes"], len(content))
+
+    def test_async_get_response(self):
+        async def get_response(request):
+            return HttpResponse(b"body")
+
+        middleware = RequestInstrumentationMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertIn("Server-Timing", response)
+        self.assertEqual(endpoint_stats.as_dict()["GET unresolved"]["count"], 1)
+
+
+@unthrottled()
+class PhotoUploadTests(TestCase):
+    def setUp(self):
+        media_root, spool_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(shutil.rmtree, spool_dir)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, PHOTO_SPOOL_DIR=spool_dir
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.backend = DatabaseBackend()
+
+    def upload(self):
+        image = io.BytesIO()
+        Image.new("RGB", (1200, 800), "red").save(image, "PNG")
+        with mock.patch("api.tasks.get_backend", return_value=self.backend):
+            return self.client.put(
+                f"/api/auth/users/{self.user.pk}/photo",
+                image.getvalue(),
+                content_type="image/png",
+                HTTP_CONTENT_DISPOSITION="attachment; filename=photo.png",
+            )
+
+    def test_processed_by_queued_task(self):
+        with mock.patch.object(default_storage, "save") as save:
+            response = self.upload()
+        save.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["photo_status"], "pending")
+        task = Task.objects.get()
+        self.assertTrue(os.path.exists(task.payload["path"]))
+
+        # A restarted worker picks the task up from the table
+        self.assertEqual(self.backend.run_next(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_status, "ready")
+        self.assertEqual(set(self.user.photo_variants), {"small", "medium", "large"})
+        with default_storage.open(self.user.photo.name) as photo:
+            self.assertEqual(Image.open(photo).size, (1024, 683))
+        self.assertFalse(os.path.exists(task.payload["path"]))
+
+        # Running the task again is a no-op
+        process_photo(**task.payload)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_status, "ready")
+
+    def test_storage_errors_are_retried(self):
+        self.upload()
+        with mock.patch.object(
+            default_storage, "save", side_effect=OSError
+        ), self.assertLogs("api.tasks", "ERROR"):
+            for _ in range(process_photo.max_retries):
+                self.backend.run_next()
+                Task.objects.update(run_at=timezone.now())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_status, "pending")
+
+        self.assertEqual(self.backend.run_next(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_status, "ready")
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_after_last_retry(self):
+        self.upload()
+        path = Task.objects.get().payload["path"]
+        with mock.patch.object(
+            default_storage, "save", side_effect=OSError
+        ), self.assertLogs("api.tasks", "ERROR"):
+            for _ in range(process_photo.max_retries + 1):
+                self.backend.run_next()
+                Task.objects.update(run_at=timezone.now())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_status, "failed")
+        self.assertFalse(os.path.exists(path))
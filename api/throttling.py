@@ -0,0 +1,166 @@
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.mixins import ListModelMixin
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import ThrottleBucket
+
+# Buckets untouched for a whole rate period are full again, so they are
+# deleted every PRUNE_INTERVAL new buckets instead of kept forever
+PRUNE_INTERVAL = 100
+
+_lock = threading.Lock()
+
+
+def get_throttle_cache():
+    return caches[settings.THROTTLE_CACHE]
+
+
+class CostRateThrottle(SimpleRateThrottle):
+    """
+    A token bucket per client, shared by all workers through the
+    api_throttlebucket table. A rate of "600/min" holds up to 600 tokens and
+    refills 600 a minute, and each request spends THROTTLE_COSTS tokens for
+    its kind.
+
+    Workers take THROTTLE_LEASE tokens from the shared bucket at a time and
+    spend them locally, so most requests don't touch the database. A client
+    can overshoot its limit by up to one lease per worker process.
+    """
+
+    def get_rate(self):
+        # Read for each request rather than once at import like DRF does
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope] or None
+        except KeyError:
+            raise ImproperlyConfigured(f"No throttle rate set for {self.scope!r}")
+
+    def get_kind(self, request, view):
+        """
+        The THROTTLE_COSTS kind of the request, from the view's throttle_cost
+        if it sets one.
+        """
+        kind = getattr(view, "throttle_cost", None)
+        if kind is not None:
+            return kind
+        if request.method != "GET":
+            return "detail"
+        if request.query_params.get("search"):
+            return "search"
+        # Viewsets know whether the route is a list; other views are lists
+        # if they list a queryset
+        if hasattr(view, "detail"):
+            listing = view.detail is False
+        else:
+            listing = isinstance(view, ListModelMixin)
+        if not listing:
+            return "detail"
+        return "list" if getattr(view, "paginator", None) else "bulk"
+
+    def allow_request(self, request, view):
+        self._wait = None
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        cost = min(
+            settings.THROTTLE_COSTS[self.get_kind(request, view)], self.num_requests
+        )
+        per_second = self.num_requests / self.duration
+        cache = get_throttle_cache()
+        with _lock:
+            tokens, retry_at = cache.get(self.key, (0, 0))
+            if tokens >= cost:
+                cache.set(self.key, (tokens - cost, retry_at))
+                return True
+            # The shared bucket was short last time; don't ask again too soon
+            if time.monotonic() < retry_at:
+                self._wait = retry_at - time.monotonic()
+                return False
+
+        need = cost - tokens
+        taken, left = self.take(need, max(need, settings.THROTTLE_LEASE), per_second)
+        with _lock:
+            tokens, _ = cache.get(self.key, (0, 0))
+            tokens += taken
+            if tokens >= cost:
+                cache.set(self.key, (tokens - cost, 0))
+                return True
+            self._wait = max(cost - tokens - left, 0) / per_second
+            cache.set(self.key, (tokens, time.monotonic() + self._wait))
+            return False
+
+    def take(self, need, want, per_second):
+        """
+        Refill the client's shared bucket and, if it holds at least `need`
+        tokens, take up to `want` of them. Returns the tokens taken and the
+        tokens left in the bucket.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            bucket, created = ThrottleBucket.objects.select_for_update().get_or_create(
+                key=self.key, defaults={"tokens": self.num_requests, "updated_at": now}
+            )
+            elapsed = max((now - bucket.updated_at).total_seconds(), 0)
+            tokens = min(self.num_requests, bucket.tokens + elapsed * per_second)
+            if tokens < need:
+                return 0, tokens
+            taken = min(want, tokens)
+            bucket.tokens = tokens - taken
+            bucket.updated_at = now
+            bucket.save(update_fields=["tokens", "updated_at"])
+
+        if created and bucket.pk % PRUNE_INTERVAL == 0:
+            ThrottleBucket.objects.filter(
+                key__startswith=self.cache_format % {"scope": self.scope, "ident": ""},
+                updated_at__lt=now - timedelta(seconds=self.duration),
+            ).delete()
+        return taken, tokens - taken
+
+    def wait(self):
+        return self._wait
+
+
+class AnonCostRateThrottle(CostRateThrottle):
+    """Limits anonymous requests per IP address."""
+
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+class UserCostRateThrottle(CostRateThrottle):
+    """
+    Limits authenticated requests per auth token and IP address, so a token
+    used from several places gets a bucket in each. Session logins count as
+    one token per user.
+    """
+
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        token = getattr(request.auth, "key", None) or f"user:{request.user.pk}"
+        # Hashed to fit the bucket key, and to keep tokens out of it
+        ident = hashlib.md5(
+            f"{token}|{self.get_ident(request)}".encode(), usedforsecurity=False
+        ).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
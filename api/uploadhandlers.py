@@ -0,0 +1,133 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageFile
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+
+# Bytes read while looking for the image header before giving up
+HEADER_LIMIT = 256 * 2**10
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload is too large."
+    default_code = "upload_too_large"
+
+
+def is_image_signature(data):
+    return data.startswith(IMAGE_SIGNATURES) or (
+        data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+    )
+
+
+class SpooledPhoto(UploadedFile):
+    """
+    An upload already written to a file in PHOTO_SPOOL_DIR, which
+    api.photos.submit_photo renames for its task to pick up. Otherwise it
+    is deleted when closed at the end of the request.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+class PhotoUploadHandler(FileUploadHandler):
+    """
+    Streams a raw photo upload straight to a temporary file while checking
+    it: the declared and streamed size against PHOTO_MAX_UPLOAD_SIZE, the
+    magic bytes of the first chunk, and the pixel dimensions from the image
+    header against PHOTO_MAX_DIMENSION. Bad uploads are rejected as soon as
+    the problem shows up instead of after the whole body has been read.
+    """
+
+    chunk_size = 64 * 2**10
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.content_length and self.content_length > settings.PHOTO_MAX_UPLOAD_SIZE:
+            raise UploadTooLarge()
+        suffix = os.path.splitext(self.file_name or "")[1]
+        os.makedirs(settings.PHOTO_SPOOL_DIR, exist_ok=True)
+        self.spool = tempfile.NamedTemporaryFile(
+            suffix=suffix, dir=settings.PHOTO_SPOOL_DIR, delete=False
+        )
+        self.header_parser = ImageFile.Parser()
+        self.header_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.PHOTO_MAX_UPLOAD_SIZE:
+            self.discard()
+            raise UploadTooLarge()
+        if not self.header_checked:
+            self.check_header(raw_data, start)
+        self.spool.write(raw_data)
+
+    def check_header(self, raw_data, start):
+        if start == 0 and not is_image_signature(raw_data):
+            self.discard()
+            raise UnsupportedMediaType(
+                self.content_type,
+                detail="Upload is not a JPEG, PNG, GIF or WebP image.",
+            )
+
+        try:
+            self.header_parser.feed(raw_data)
+        except Image.DecompressionBombError:
+            # Pillow's own pixel limit, hit before the header yields a size
+            self.discard()
+            raise ParseError(
+                f"Image dimensions exceed the {settings.PHOTO_MAX_DIMENSION}px limit."
+            )
+        except (OSError, SyntaxError):
+            self.discard()
+            raise ParseError("Upload is not a readable image.")
+        image = self.header_parser.image
+        if image is None:
+            if start + len(raw_data) > HEADER_LIMIT:
+                self.discard()
+                raise ParseError("Upload is not a readable image.")
+            return
+
+        self.header_checked = True
+        if max(image.size) > settings.PHOTO_MAX_DIMENSION:
+            self.discard()
+            raise ParseError(
+                f"Image dimensions {image.size[0]}x{image.size[1]} exceed the "
+                f"{settings.PHOTO_MAX_DIMENSION}px limit."
+            )
+
+    def file_complete(self, file_size):
+        if not self.header_checked:
+            self.discard()
+            raise ParseError("Upload is not a readable image.")
+        self.spool.flush()
+        self.spool.seek(0)
+        return SpooledPhoto(
+            self.spool,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        self.discard()
+
+    def discard(self):
+        spool = getattr(self, "spool", None)
+        if spool is not None:
+            spool.close()
+            if os.path.exists(spool.name):
+                os.remove(spool.name)
@@ -1,88 +1,465 @@
-from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied, ParseError
-from rest_framework.generics import CreateAPIView, ListCreateAPIView, get_object_or_404
+from rest_framework.exceptions import PermissionDenied, ParseError, ValidationError
+from rest_framework.generics import (
+    CreateAPIView,
+    ListAPIView,
+    ListCreateAPIView,
+    get_object_or_404,
+)
 from rest_framework.parsers import JSONParser, FileUploadParser
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
-from .models import Book, BookRecord, BookReview, User
+from rest_framework.views import APIView
+from rest_framework.mixins import (
+    DestroyModelMixin,
+    RetrieveModelMixin,
+    UpdateModelMixin,
+)
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
+from .models import Activity, Book, BookRecord, BookReview, BookStats, User
+from .fastpath import ValuesListMixin
+from .exports import CSVRenderer, NDJSONRenderer, stream_export
+from .feed import (
+    Timeline,
+    follow,
+    publish,
+    reading_state_activity,
+    review_activity,
+    unfollow,
+)
+from .parsers import NDJSONParser
+from .recommendations import queue_refresh, recommended_books, similar_books
+from .photos import submit_photo
+from .uploadhandlers import PhotoUploadHandler
 from .serializers import (
+    ActivitySerializer,
     BookSerializer,
+    BookRecordBulkItemSerializer,
     BookDetailSerializer,
     BookRecordSerializer,
     BookReviewSerializer,
+    BookStatsSerializer,
+    PopularBookSerializer,
+    ScoredBookSerializer,
     UserCreateSerializer,
     UserSerializer,
 )
+from .authentication import get_token_cache, token_cache_stats
+from .cache import book_response_cache, cache_response
+from .conditional import conditional_response
+from .instrumentation import endpoint_stats
+from .pagination import (
+    BookPagination,
+    BookRecordPagination,
+    BookReviewPagination,
+    FeedPagination,
+    PopularBookPagination,
+)
 from .custom_permissions import (
     IsAdminOrReadOnly,
     IsReaderOrReadOnly,
     IsReviewerOrReadOnly,
+    filter_writable,
 )
 
 
-class BookViewSet(ModelViewSet):
+class EagerLoadingViewMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, "setup_eager_loading"):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class BookViewSet(ValuesListMixin, EagerLoadingViewMixin, ModelViewSet):
     queryset = Book.objects.all().order_by("title")
     serializer_class = BookDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = BookPagination
+    throttle_cost = None
 
     def get_serializer_class(self):
         if self.action in ["list"]:
             return BookSerializer
+        if self.action == "popular":
+            return PopularBookSerializer
+        if self.action == "stats":
+            return BookStatsSerializer
+        if self.action == "similar":
+            return ScoredBookSerializer
         return super().get_serializer_class()
 
+    def get_cache_scopes(self, scopes):
+        # Search matches review text, so results change with any review
+        if self.request.query_params.get("search"):
+            return [*scopes, "reviews"]
+        return scopes
+
+    @conditional_response
+    @cache_response("books")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response
+    @cache_response("book:{pk}")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False)
+    @conditional_response
+    @cache_response("books", "reviews")
     def featured(self, request):
-        featured_books = Book.objects.filter(featured=True)
+        featured_books = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(featured_books, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, pagination_class=PopularBookPagination)
+    def popular(self, request):
+        books = self.paginate_queryset(
+            self.get_queryset().annotate(popularity=F("stats__popularity"))
+        )
+        serializer = self.get_serializer(books, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        book = self.get_object()
+        stats = BookStats.objects.filter(book=book).first() or BookStats(book=book)
+        return Response(self.get_serializer(stats).data)
+
+    @action(detail=True, throttle_cost="list")
+    def similar(self, request, pk=None):
+        book = self.get_object()
+        serializer = self.get_serializer(similar_books(book.pk), many=True)
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+        throttle_cost="bulk",
+    )
+    def export(self, request):
+        fields = {
+            "pk": "pk",
+            "title": "title",
+            "author": "author",
+            "publication_year": "publication_year",
+            "featured": "featured",
+            "created_at": "created_at",
+            "updated_at": "updated_at",
+        }
+        return stream_export(
+            Book.objects.order_by("pk"),
+            fields,
+            request.accepted_renderer.format,
+            "books",
+        )
+
     def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "featured":
+            queryset = queryset.filter(featured=True)
+        if self.action == "popular":
+            queryset = queryset.filter(stats__popularity__gt=0)
         if self.request.query_params.get("search"):
-            search_term = self.request.query_params.get("search")
-            queryset = Book.objects.annotate(
-                search=SearchVector("title", "reviews__body")
-            ).filter(search=search_term)
-            return queryset
-        return super().get_queryset()
+            search_query = SearchQuery(self.request.query_params.get("search"))
+            queryset = (
+                queryset.filter(search_document=search_query)
+                # ts_rank() is a float4; as a float8 the value in a page
+                # cursor compares equal to the row it came from
+                .annotate(
+                    rank=Cast(
+                        SearchRank(F("search_document"), search_query), FloatField()
+                    )
+                ).order_by("-rank", "-pk")
+            )
+        return queryset
 
 
-class BookRecordViewSet(ModelViewSet):
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                "book_responses": book_response_cache.stats.as_dict(
+                    book_response_cache.cache
+                ),
+                "auth_tokens": token_cache_stats.as_dict(get_token_cache()),
+            }
+        )
+
+
+class RequestMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                "enabled": settings.REQUEST_INSTRUMENTATION,
+                "window": endpoint_stats.window,
+                "endpoints": endpoint_stats.as_dict(),
+            }
+        )
+
+    def delete(self, request):
+        endpoint_stats.clear()
+        return Response(status=204)
+
+
+class BookRecordViewSet(ValuesListMixin, EagerLoadingViewMixin, ModelViewSet):
     queryset = BookRecord.objects.all()
     serializer_class = BookRecordSerializer
     permission_classes = [IsAuthenticated, IsReaderOrReadOnly]
+    pagination_class = BookRecordPagination
+    throttle_cost = None
 
     def get_queryset(self):
         queryset = super().get_queryset()
         return queryset.filter(reader=self.request.user)
 
+    def get_validator_aggregates(self):
+        # Records embed their book, so a book edit changes the representation
+        return {
+            "updated_at": Max("updated_at"),
+            "book_updated_at": Max("book__updated_at"),
+        }
+
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        serializer.save(reader=self.request.user)
+        record = serializer.save(reader=self.request.user)
+        if record.reading_state:
+            publish([reading_state_activity(record)])
+
+    def perform_update(self, serializer):
+        previous_state = serializer.instance.reading_state
+        record = serializer.save()
+        if record.reading_state and record.reading_state != previous_state:
+            publish([reading_state_activity(record)])
+
+    @action(
+        detail=False,
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+        throttle_cost="bulk",
+    )
+    def export(self, request):
+        fields = {
+            "pk": "pk",
+            "book": "book_id",
+            "title": "book__title",
+            "author": "book__author",
+            "reading_state": "reading_state",
+            "created_at": "created_at",
+            "updated_at": "updated_at",
+        }
+        return stream_export(
+            BookRecord.objects.filter(reader=request.user).order_by("pk"),
+            fields,
+            request.accepted_renderer.format,
+            "book_records",
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        parser_classes=[JSONParser, NDJSONParser],
+        throttle_cost="bulk",
+    )
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise ParseError("Expected a list of book records")
+
+        items, errors = [], []
+        for data in request.data:
+            item_serializer = BookRecordBulkItemSerializer(data=data)
+            item_serializer.is_valid()
+            items.append(item_serializer.validated_data)
+            errors.append(dict(item_serializer.errors))
+
+        book_ids = {item["book"] for item in items if "book" in item}
+        known_book_ids = set(
+            Book.objects.filter(pk__in=book_ids).values_list("pk", flat=True)
+        )
+        records = filter_writable(request, self, BookRecord.objects.all()).in_bulk(
+            {item["pk"] for item in items if "pk" in item}
+        )
+        for item, item_errors in zip(items, errors):
+            if "book" in item and item["book"] not in known_book_ids:
+                item_errors["book"] = [f"Book {item['book']} does not exist."]
+            if "pk" in item and item["pk"] not in records:
+                item_errors["pk"] = [f"Book record {item['pk']} does not exist."]
+        if any(errors):
+            return Response(errors, status=400)
+
+        new_records, updated_records = [], []
+        now = timezone.now()
+        for item in items:
+            if "pk" in item:
+                record = records[item["pk"]]
+                record.book_id = item.get("book", record.book_id)
+                record.reading_state = item.get("reading_state", record.reading_state)
+                record.updated_at = now
+                updated_records.append(record)
+            else:
+                new_records.append(
+                    BookRecord(
+                        reader=request.user,
+                        book_id=item["book"],
+                        reading_state=item.get("reading_state"),
+                    )
+                )
+
+        with transaction.atomic():
+            BookRecord.objects.bulk_create(
+                new_records, batch_size=settings.BULK_BATCH_SIZE
+            )
+            BookRecord.objects.bulk_update(
+                updated_records,
+                ["book", "reading_state", "updated_at"],
+                batch_size=settings.BULK_BATCH_SIZE,
+            )
+            # _counted_state still holds the state each record was loaded with
+            changed_records = [
+                record
+                for record in updated_records
+                if record.reading_state != record._counted_state[1]
+            ]
+            publish(
+                [
+                    reading_state_activity(record)
+                    for record in new_records + changed_records
+                    if record.reading_state
+                ]
+            )
+            queue_refresh(
+                [
+                    ((None, None), (record.book_id, record.reading_state))
+                    for record in new_records
+                ]
+                + [
+                    (record._counted_state, (record.book_id, record.reading_state))
+                    for record in updated_records
+                ]
+            )
+            # bulk writes skip the signals that keep book stats current
+            BookStats.objects.reconcile(
+                {record.book_id for record in new_records + updated_records}
+                | {record._counted_state[0] for record in updated_records}
+            )
+
+        return Response(
+            {
+                "created": [record.pk for record in new_records],
+                "updated": [record.pk for record in updated_records],
+            },
+            status=201 if new_records else 200,
+        )
 
 
 class BookRecordCreateView(CreateAPIView):
     pass
 
 
-class BookReviewListCreateView(ListCreateAPIView):
-    serializer_class = BookReviewSerializer
-    permission_classes = [IsAuthenticated]
-
+class ReviewSearchMixin:
     def get_queryset(self):
-        queryset = BookReview.objects.filter(book_id=self.kwargs["book_pk"])
+        queryset = super().get_queryset()
         search_term = self.request.query_params.get("search")
-        if search_term is not None:
-            queryset = queryset.filter(
-                body__search=self.request.query_params.get("search")
+        if search_term:
+            search_query = SearchQuery(search_term, config=BookReview.SEARCH_CONFIG)
+            queryset = queryset.filter(search_vector=search_query).annotate(
+                rank=Cast(SearchRank(F("search_vector"), search_query), FloatField()),
+                headline=SearchHeadline(
+                    "body", search_query, config=BookReview.SEARCH_CONFIG
+                ),
             )
-
         return queryset
 
+
+class BookReviewSearchView(ReviewSearchMixin, EagerLoadingViewMixin, ListAPIView):
+    queryset = BookReview.objects.defer("search_vector", "book__search_document")
+    serializer_class = BookReviewSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = BookReviewPagination
+
+
+class BookReviewListCreateView(
+    ReviewSearchMixin, EagerLoadingViewMixin, ListCreateAPIView
+):
+    queryset = BookReview.objects.defer("search_vector", "book__search_document")
+    serializer_class = BookReviewSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = BookReviewPagination
+
+    def get_queryset(self):
+        return super().get_queryset().filter(book_id=self.kwargs["book_pk"])
+
     def perform_create(self, serializer, **kwargs):
         book = get_object_or_404(Book, pk=self.kwargs["book_pk"])
-        serializer.save(reviewed_by=self.request.user, book=book)
+        review = serializer.save(reviewed_by=self.request.user, book=book)
+        publish([review_activity(review)])
+
+
+class BookReviewViewSet(
+    EagerLoadingViewMixin,
+    RetrieveModelMixin,
+    UpdateModelMixin,
+    DestroyModelMixin,
+    GenericViewSet,
+):
+    queryset = BookReview.objects.defer("search_vector", "book__search_document")
+    serializer_class = BookReviewSerializer
+    permission_classes = [IsAuthenticated, IsReviewerOrReadOnly]
+
+
+class RecommendationsView(ListAPIView):
+    serializer_class = ScoredBookSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    # At most PAGE_SIZE rows, so it costs as much as a page of a list
+    throttle_cost = "list"
+
+    def get_queryset(self):
+        return recommended_books(self.request.user)[: settings.PAGE_SIZE]
+
+
+class FeedView(EagerLoadingViewMixin, ListAPIView):
+    queryset = Activity.objects.defer("book__search_document", "review__search_vector")
+    serializer_class = ActivitySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FeedPagination
+
+    def get_queryset(self):
+        return Timeline(self.request.user, super().get_queryset())
+
+
+class FollowView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        user = get_object_or_404(User, pk=id)
+        if user == request.user:
+            raise ValidationError("You cannot follow yourself.")
+        created = follow(request.user, user)
+        return Response(status=201 if created else 200)
+
+    def delete(self, request, id):
+        unfollow(request.user, get_object_or_404(User, pk=id))
+        return Response(status=204)
 
 
 class UserViewSet(DjoserUserViewSet):
@@ -90,21 +467,24 @@ class UserViewSet(DjoserUserViewSet):
     serlializer_class = UserCreateSerializer
     parser_classes = [JSONParser, FileUploadParser]
 
-    @action(detail=True, methods=["put", "patch"])
+    @action(detail=True, methods=["put", "patch"], parser_classes=[FileUploadParser])
     def photo(self, request, id=None):
+        # Check ownership before reading the body, then stream it through
+        # PhotoUploadHandler so oversized or non-image uploads stop early
+        user = self.get_object()
+        request.upload_handlers = [PhotoUploadHandler(request)]
         if "file" not in request.data:
             raise ParseError("Missing file attachment")
 
         file = request.data["file"]
-        user = self.get_object()
-        user.photo.save(file.name, file, save=True)
+        submit_photo(user, file)
 
         serializer = self.get_serializer(user)
-        return Response(serializer.data, status=201)
+        return Response(serializer.data, status=202)
 
     def get_object(self):
         user_instance = get_object_or_404(self.get_queryset(), pk=self.kwargs["id"])
-        if self.request.user is not user_instance:
+        if self.request.user != user_instance:
             raise PermissionDenied()
         return user_instance
 
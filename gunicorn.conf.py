@@ -0,0 +1,19 @@
+# Gunicorn settings, read from the environment so the WSGI and ASGI
+# deployments can be tuned without code changes.
+#
+#   WSGI: gunicorn library.wsgi
+#   ASGI: GUNICORN_APP=library.asgi GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+#
+# https://docs.gunicorn.org/en/stable/settings.html
+
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+backlog = int(os.environ.get("GUNICORN_BACKLOG", 2048))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 import environ
 import django_on_heroku
@@ -19,6 +21,43 @@ env = environ.Env(
     # set casting, default value
     DEBUG=(bool, False),
     USE_S3=(bool, False),
+    PAGE_SIZE=(int, 25),
+    MAX_PAGE_SIZE=(int, 100),
+    BULK_BATCH_SIZE=(int, 500),
+    EXPORT_CHUNK_SIZE=(int, 2000),
+    BOOK_CACHE_BACKEND=(str, "api.cache.LRUCache"),
+    BOOK_CACHE_LOCATION=(str, "book-responses"),
+    BOOK_CACHE_MAX_ENTRIES=(int, 5000),
+    AUTH_TOKEN_CACHE_TTL=(int, 5),
+    AUTH_TOKEN_CACHE_MAX_ENTRIES=(int, 10000),
+    PHOTO_STORAGE_WORKERS=(int, 6),
+    PHOTO_MAX_UPLOAD_SIZE=(int, 10 * 2**20),
+    PHOTO_MAX_DIMENSION=(int, 8000),
+    PHOTO_SPOOL_DIR=(str, str(Path(tempfile.gettempdir()) / "photo-uploads")),
+    ASYNC_VIEWS=(bool, False),
+    ASYNC_VIEW_THREADS=(int, 8),
+    REQUEST_INSTRUMENTATION=(bool, False),
+    VALUES_LIST_SERIALIZATION=(bool, True),
+    JSON_FRAGMENT_CACHE_MAX_ENTRIES=(int, 0),
+    CONN_MAX_AGE=(int, 600),
+    CONN_HEALTH_CHECKS=(bool, True),
+    DB_POOL_SIZE=(int, 0),
+    DB_POOL_MAX_OVERFLOW=(int, 10),
+    DB_POOL_TIMEOUT=(float, 10.0),
+    REQUEST_INSTRUMENTATION_WINDOW=(int, 1000),
+    FEED_MAX_ENTRIES=(int, 500),
+    FEED_FANOUT_MAX_FOLLOWERS=(int, 1000),
+    FEED_TRIM_INTERVAL=(int, 20),
+    TASK_BACKEND=(str, "api.tasks.LocalBackend"),
+    TASK_WORKERS=(int, 2),
+    SIMILAR_BOOKS_TOP_K=(int, 20),
+    SIMILAR_BOOKS_MIN_CO_READERS=(int, 2),
+    THROTTLE_USER_RATE=(str, "600/min"),
+    THROTTLE_ANON_RATE=(str, "60/min"),
+    THROTTLE_LEASE=(int, 20),
+    THROTTLE_CACHE_MAX_ENTRIES=(int, 10000),
+    # Heroku's router, the one proxy in front of a dyno, sets DYNO
+    NUM_PROXIES=(int, 1 if "DYNO" in os.environ else 0),
 )
 environ.Env.read_env()
 
@@ -58,6 +97,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.instrumentation.RequestInstrumentationMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -89,6 +129,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "library.wsgi.application"
 
+# library/asgi.py turns ASYNC_VIEWS on, routing the read-heavy book
+# endpoints through the async views in api/async_views.py, which run
+# requests on a pool of ASYNC_VIEW_THREADS threads per worker process
+ASYNC_VIEWS = env("ASYNC_VIEWS")
+ASYNC_VIEW_THREADS = env("ASYNC_VIEW_THREADS")
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -96,6 +142,50 @@ WSGI_APPLICATION = "library.wsgi.application"
 DATABASES = {"default": env.db()}
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Book catalogue responses are invalidated by the signal handlers in
+# api/signals.py; the timeout only bounds how long unused entries linger.
+# The generation tokens that invalidate them are kept in the database, so
+# api.cache.LRUCache in each worker process never serves a response another
+# worker has invalidated. A shared backend such as
+# django.core.cache.backends.filebased.FileBasedCache lets workers reuse
+# each other's entries as well.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "book_responses": {
+        "BACKEND": env("BOOK_CACHE_BACKEND"),
+        "LOCATION": env("BOOK_CACHE_LOCATION"),
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": env("BOOK_CACHE_MAX_ENTRIES")},
+    },
+    # Token to user lookups for api.authentication.CachedTokenAuthentication.
+    # Each worker keeps its own copy, so the TTL bounds how long another
+    # worker can keep accepting a deleted token or deactivated user. A few
+    # seconds still saves the lookup for bursts of requests from a client.
+    "auth_tokens": {
+        "BACKEND": "api.cache.LRUCache",
+        "LOCATION": "auth-tokens",
+        "TIMEOUT": env("AUTH_TOKEN_CACHE_TTL"),
+        "OPTIONS": {"MAX_ENTRIES": env("AUTH_TOKEN_CACHE_MAX_ENTRIES")},
+    },
+    # Rate limit tokens each worker has taken from the shared buckets of
+    # api.throttling. Tokens left unspent when an entry expires are dropped.
+    "throttle": {
+        "BACKEND": "api.cache.LRUCache",
+        "LOCATION": "throttle",
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": env("THROTTLE_CACHE_MAX_ENTRIES")},
+    },
+}
+BOOK_RESPONSE_CACHE = "book_responses"
+AUTH_TOKEN_CACHE = "auth_tokens"
+THROTTLE_CACHE = "throttle"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -140,6 +230,17 @@ STATICFILES_DIRS = [
 MEDIA_URL = "/media/"
 MEDIA_DIR = BASE_DIR / "media"
 
+# Threads that write the resized variants of a profile photo to storage in
+# parallel (see api/photos.py)
+PHOTO_STORAGE_WORKERS = env("PHOTO_STORAGE_WORKERS")
+# Largest accepted upload in bytes and longest accepted edge in pixels,
+# enforced while the upload streams in (see api/uploadhandlers.py)
+PHOTO_MAX_UPLOAD_SIZE = env("PHOTO_MAX_UPLOAD_SIZE")
+PHOTO_MAX_DIMENSION = env("PHOTO_MAX_DIMENSION")
+# Local directory uploads are streamed to and left in for process_photo,
+# which stores them off the request path. Task workers must share it.
+PHOTO_SPOOL_DIR = env("PHOTO_SPOOL_DIR")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -156,15 +257,108 @@ INTERNAL_IPS = [
 django_on_heroku.settings(locals())
 del DATABASES["default"]["OPTIONS"]["sslmode"]
 
+# Keep connections open for CONN_MAX_AGE seconds, checking a reused one
+# before its first query in each request. With DB_POOL_SIZE set, each
+# worker process shares a pool of connections between its threads instead;
+# CONN_MAX_AGE=0 then hands a connection back to the pool after every
+# request. Both are provided by the backend in api/db/postgresql.
+DATABASES["default"]["CONN_MAX_AGE"] = env("CONN_MAX_AGE")
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env("CONN_HEALTH_CHECKS")
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"]["ENGINE"] = "api.db.postgresql"
+    if env("DB_POOL_SIZE"):
+        DATABASES["default"]["POOL"] = {
+            "size": env("DB_POOL_SIZE"),
+            "max_overflow": env("DB_POOL_MAX_OVERFLOW"),
+            "timeout": env("DB_POOL_TIMEOUT"),
+        }
+
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("api.authentication.CachedTokenAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly"
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api.throttling.AnonCostRateThrottle",
+        "api.throttling.UserCostRateThrottle",
+    ],
+    # Tokens per period; an empty rate turns the limit off
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": env("THROTTLE_ANON_RATE"),
+        "user": env("THROTTLE_USER_RATE"),
+    },
+    # Proxies in front of the app that append to X-Forwarded-For (1 by
+    # default on Heroku); requests are limited by the address before them
+    "NUM_PROXIES": env("NUM_PROXIES"),
+}
+
+# Default and upper bound for the ?page_size= query parameter on the
+# cursor-paginated list endpoints (see api/pagination.py)
+PAGE_SIZE = env("PAGE_SIZE")
+MAX_PAGE_SIZE = env("MAX_PAGE_SIZE")
+
+# Rows per INSERT/UPDATE statement for bulk endpoints such as
+# POST api/book_records/bulk
+BULK_BATCH_SIZE = env("BULK_BATCH_SIZE")
+
+# Serve the book list and reading log list from queryset.values() rows
+# (api/fastpath.py) rather than per-object serializer fields
+VALUES_LIST_SERIALIZATION = env("VALUES_LIST_SERIALIZATION")
+
+# Encoded book representations kept per worker process by
+# api.renderers.fragment_cache for those lists. Off (0) by default: for the
+# small book representation, encoding with orjson is cheaper than fetching
+# updated_at to key the cache, but larger representations can gain from it
+JSON_FRAGMENT_CACHE_MAX_ENTRIES = env("JSON_FRAGMENT_CACHE_MAX_ENTRIES")
+
+# Rows fetched per round trip by the server-side cursor behind the
+# streaming export endpoints
+EXPORT_CHUNK_SIZE = env("EXPORT_CHUNK_SIZE")
+
+# api.instrumentation.RequestInstrumentationMiddleware adds Server-Timing
+# headers and a JSON log line per request, and keeps the last
+# REQUEST_INSTRUMENTATION_WINDOW requests of each endpoint for
+# api/request_metrics. Queries are timed with connection.execute_wrapper(),
+# so DEBUG does not need to be on.
+REQUEST_INSTRUMENTATION = env("REQUEST_INSTRUMENTATION")
+REQUEST_INSTRUMENTATION_WINDOW = env("REQUEST_INSTRUMENTATION_WINDOW")
+LOGGING["loggers"]["api.instrumentation"] = {
+    "handlers": ["console"],
+    "level": "INFO",
+    "propagate": False,
 }
 
+# api/feed: each reader's timeline keeps about FEED_MAX_ENTRIES activities,
+# trimmed by every FEED_TRIM_INTERVAL-th activity fanned out. Accounts with
+# more than FEED_FANOUT_MAX_FOLLOWERS followers are not fanned out; their
+# activity is merged into followers' feeds when they are read.
+FEED_MAX_ENTRIES = env("FEED_MAX_ENTRIES")
+FEED_FANOUT_MAX_FOLLOWERS = env("FEED_FANOUT_MAX_FOLLOWERS")
+FEED_TRIM_INTERVAL = env("FEED_TRIM_INTERVAL")
+
+# Where api.tasks background tasks run: "api.tasks.LocalBackend" runs them on
+# TASK_WORKERS threads in each web process, "api.tasks.DatabaseBackend" queues
+# them in the database for `manage.py run_worker`
+TASK_BACKEND = env("TASK_BACKEND")
+TASK_WORKERS = env("TASK_WORKERS")
+
+# Neighbours kept per book for api/books/{id}/similar and api/recommendations,
+# and the readers two books must share to count as similar at all
+SIMILAR_BOOKS_TOP_K = env("SIMILAR_BOOKS_TOP_K")
+SIMILAR_BOOKS_MIN_CO_READERS = env("SIMILAR_BOOKS_MIN_CO_READERS")
+
+# api.throttling: tokens a request spends by kind, roughly in proportion to
+# their measured latency. Pages of lists cost more than single objects,
+# searches more again, and unpaginated lists, exports and bulk writes the
+# most. Workers take THROTTLE_LEASE tokens from a client's shared bucket at
+# a time.
+THROTTLE_COSTS = {"detail": 1, "list": 2, "search": 5, "bulk": 10}
+THROTTLE_LEASE = env("THROTTLE_LEASE")
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "content-disposition",
@@ -13,29 +13,76 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from api import views as api_views
+from api.async_views import offload, offload_urlpatterns
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter(trailing_slash=False)
 router.register("books", api_views.BookViewSet, basename="books")
+router.register(
+    "book_records",
+    api_views.BookRecordViewSet,
+    basename="book_records",
+)
+router.register(
+    "book_reviews",
+    api_views.BookReviewViewSet,
+    basename="book_reviews",
+)
 router.register("auth/users", api_views.UserViewSet)
 
+api_urls = router.urls
+book_reviews_view = api_views.BookReviewListCreateView.as_view()
+if settings.ASYNC_VIEWS:
+    # Under ASGI, serve the read-heavy book endpoints from async views
+    api_urls = offload_urlpatterns(
+        api_urls, {"books-list", "books-detail", "books-featured"}
+    )
+    book_reviews_view = offload(book_reviews_view)
+
 urlpatterns = [
-    path("api/", include(router.urls)),
+    path("api/", include(api_urls)),
     path(
         "api/books/<int:book_pk>/reviews",
-        api_views.BookReviewListCreateView.as_view(),
+        book_reviews_view,
         name="book_reviews",
     ),
+    path(
+        "api/reviews",
+        api_views.BookReviewSearchView.as_view(),
+        name="review_search",
+    ),
     path(
         "api/books/<int:book_pk>/book_records/",
         api_views.BookRecordCreateView.as_view(),
         name="book_record_create",
     ),
+    path("api/feed", api_views.FeedView.as_view(), name="feed"),
+    path(
+        "api/recommendations",
+        api_views.RecommendationsView.as_view(),
+        name="recommendations",
+    ),
+    path(
+        "api/auth/users/<int:id>/follow",
+        api_views.FollowView.as_view(),
+        name="user_follow",
+    ),
+    path(
+        "api/cache_stats",
+        api_views.CacheStatsView.as_view(),
+        name="cache_stats",
+    ),
+    path(
+        "api/request_metrics",
+        api_views.RequestMetricsView.as_view(),
+        name="request_metrics",
+    ),
     path("auth/", include("djoser.urls.authtoken")),
     path("admin/", admin.site.urls),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)